@@ -0,0 +1,135 @@
+"""
+Benchmark of the existence check that matches the connector users against the users in SIGN.
+
+It compares the nested scan check_user_existence used before the email index (an any() scan plus a substring scan
+over every SIGN user for every connector user) with the Reconciler index the sync uses now.
+
+Run it from the ss_standalone directory:
+
+    python benchmarks/check_user_existence.py
+    python benchmarks/check_user_existence.py --sizes 10000 100000 --max-scan 100000
+
+The nested scan grows with the square of the users and takes about an hour at 100k users. Above --max-scan users
+it is timed on a sample of the connector users and extrapolated, which the output marks with a '~'.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sign_sync.reconciliation
+import sign_sync.user_record
+
+
+def make_sign_users(count):
+    """
+    This function creates the users of a SIGN account as the users listing returns them.
+    :param count: int
+    :return: list[dict()]
+    """
+
+    return [{'email': 'User{}@Example.com'.format(i), 'userId': 'id{}'.format(i)} for i in range(count)]
+
+
+def make_source_users(count):
+    """
+    This function creates the connector users that match the SIGN users, in a different order.
+    :param count: int
+    :return: list[UserRecord]
+    """
+
+    users = [sign_sync.user_record.UserRecord('user{}@example.com'.format(i), 'First', 'Last', ['Sign Users'])
+             for i in range(count)]
+    random.shuffle(users)
+
+    return users
+
+
+def nested_scan(user_list, sign_users):
+    """
+    This function is the existence check as it was before the email index.
+    :param user_list: list[UserRecord]
+    :param sign_users: list[dict()]
+    :return: list[UserRecord]
+    """
+
+    updated_user_list = []
+
+    for user in user_list:
+        if any(target_user['email'].lower() == user.email.lower() for target_user in sign_users):
+            pass
+
+        for sign_user in sign_users:
+            if user.email.lower() in sign_user['email'].lower():
+                user.user_id = sign_user['userId']
+                updated_user_list.append(user)
+
+    return updated_user_list
+
+
+def index_lookup(user_list, sign_users):
+    """
+    This function is the existence check as the sync runs it now.
+    :param user_list: list[UserRecord]
+    :param sign_users: list[dict()]
+    :return: list[UserRecord]
+    """
+
+    return sign_sync.reconciliation.Reconciler(user_list).reconcile(iter(sign_users))['update']
+
+
+def time_nested_scan(user_list, sign_users, max_scan, sample):
+    """
+    This function times the nested scan over all users, or over a sample of them when there are more than max_scan.
+    :param user_list: list[UserRecord]
+    :param sign_users: list[dict()]
+    :param max_scan: int
+    :param sample: int
+    :return: float, bool
+    """
+
+    if len(user_list) <= max_scan:
+        start = time.perf_counter()
+        nested_scan(user_list, sign_users)
+        return time.perf_counter() - start, False
+
+    start = time.perf_counter()
+    nested_scan(user_list[:sample], sign_users)
+
+    return (time.perf_counter() - start) / sample * len(user_list), True
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Benchmark the SIGN user existence check.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 500000])
+    parser.add_argument('--max-scan', type=int, default=10000,
+                        help='largest size the nested scan is run completely for')
+    parser.add_argument('--sample', type=int, default=200,
+                        help='connector users the nested scan is timed on above --max-scan')
+    args = parser.parse_args()
+
+    print('Python {}'.format(sys.version.split()[0]))
+    print('{:>8}  {:>14}  {:>10}'.format('users', 'nested scan', 'index'))
+
+    for count in args.sizes:
+        sign_users = make_sign_users(count)
+        user_list = make_source_users(count)
+
+        start = time.perf_counter()
+        matched = index_lookup(user_list, sign_users)
+        index_time = time.perf_counter() - start
+        assert len(matched) == count
+
+        scan_time, extrapolated = time_nested_scan(user_list, sign_users, args.max_scan, args.sample)
+
+        print('{:>8}  {:>14}  {:>10}'.format(
+            count, '{}{:.1f}s'.format('~' if extrapolated else '', scan_time), '{:.3f}s'.format(index_time)))
+
+
+if __name__ == '__main__':
+    main()
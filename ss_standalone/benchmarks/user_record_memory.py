@@ -0,0 +1,121 @@
+"""
+Benchmark of the memory the connector users take for the whole sync.
+
+It builds LDAP shaped users the way create_user_json formats them, once as the dict records the connectors used to
+emit and once as UserRecord objects, and reports what stays allocated with tracemalloc.
+
+Run it from the ss_standalone directory:
+
+    python benchmarks/user_record_memory.py
+    python benchmarks/user_record_memory.py --users 100000 --groups 200
+"""
+
+import argparse
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sign_sync.reconciliation
+import sign_sync.user_record
+
+
+def make_user_info(number, group_dns):
+    """
+    This function creates the attributes of a user as the LDAP search returns them.
+    :param number: int
+    :param group_dns: list[bytes]
+    :return: dict()
+    """
+
+    return {
+        'memberOf': [group_dns[number % len(group_dns)], group_dns[number * 7 % len(group_dns)],
+                     b'CN=SIGN_GROUP_ADMIN,OU=Sign,DC=example,DC=com'],
+        'mail': ['user{}@example.com'.format(number).encode('utf-8')],
+        'givenName': ['First{}'.format(number).encode('utf-8')],
+        'sn': ['Last{}'.format(number).encode('utf-8')]
+    }
+
+
+def get_groups(user_info):
+    """
+    This function decodes the group names of a user like create_user_json does.
+    :param user_info: dict()
+    :return: list[]
+    """
+
+    return [group.decode('utf-8').split(',')[0][3:] for group in user_info['memberOf']]
+
+
+def as_dict(user_info):
+    """
+    This function formats a user as the dict record the connectors emitted before UserRecord. The reconciler kept
+    the normalized email of every record as its key.
+    :param user_info: dict()
+    :return: dict(), str
+    """
+
+    email = user_info['mail'][0].decode('utf-8')
+    user = {
+        'email': email,
+        'firstname': user_info['givenName'][0].decode('utf-8'),
+        'groups': get_groups(user_info),
+        'lastname': user_info['sn'][0].decode('utf-8'),
+        'username': user_info['mail'][0].decode('utf-8')
+    }
+
+    return user, sign_sync.reconciliation.normalize_email(email)
+
+
+def as_record(user_info):
+    """
+    This function formats a user as the UserRecord the connectors emit now. The record carries its own key.
+    :param user_info: dict()
+    :return: UserRecord
+    """
+
+    return sign_sync.user_record.UserRecord(user_info['mail'][0].decode('utf-8'),
+                                            user_info['givenName'][0].decode('utf-8'),
+                                            user_info['sn'][0].decode('utf-8'),
+                                            get_groups(user_info))
+
+
+def measure(func, count, group_dns):
+    """
+    This function returns the bytes that stay allocated for count users formatted by func.
+    :param func: FUNCTION
+    :param count: int
+    :param group_dns: list[bytes]
+    :return: int
+    """
+
+    tracemalloc.start()
+    users = [func(make_user_info(number, group_dns)) for number in range(count)]
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del users
+
+    return retained
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Benchmark the memory of the connector user records.')
+    parser.add_argument('--users', type=int, default=500000)
+    parser.add_argument('--groups', type=int, default=50)
+    args = parser.parse_args()
+
+    group_dns = ['CN=Group{},OU=Sign,DC=example,DC=com'.format(number).encode('utf-8')
+                 for number in range(args.groups)]
+
+    print('Python {}, {} users, {} groups'.format(sys.version.split()[0], args.users, args.groups))
+
+    for name, func in (('dict', as_dict), ('UserRecord', as_record)):
+        retained = measure(func, args.users, group_dns)
+        print('{:<10}  {:>8.1f} MB retained  {:>5} bytes/user'.format(
+            name, retained / 1e6, retained // args.users))
+
+
+if __name__ == '__main__':
+    main()
@@ -31,5 +31,8 @@ setup(name='sign_sync_standalone',
           'requests',
           'six',
           'umapi-client'
-      ]
+      ],
+      extras_require={
+          'async': ['aiohttp']
+      }
 )
@@ -1,14 +1,15 @@
 import time
 import datetime
-import json
-import os
+import importlib
 import sys
+import requests
 import sign_sync.logger
 import sign_sync.connections.sign_connection
 import sign_sync.connections.umapi_connection
 import sign_sync.connections.ldap_connection
+import sign_sync.reconciliation
+import sign_sync.sync_cache
 import sign_sync.thread_functions
-from queue import Queue
 
 import sign_sync.connections.azure_connection
 
@@ -23,15 +24,15 @@ def main():
     # Instantiate Sign object & validate
     sign_obj = sign_sync.connections.sign_connection.Sign(log_file)
     sign_obj.validate_integration_key(sign_obj.header, sign_obj.url)
-    sign_groups = sign_obj.get_sign_group()
+    sign_groups = sign_obj.group_directory
 
     # Get all of the configuration and connector needed to run the application
     if sign_obj.connector == 'ldap':
-        data_connector = sign_sync.connections.ldap_connection.LdapConfig()
+        data_connector = sign_sync.connections.ldap_connection.LdapConfig(log_file)
     elif sign_obj.connector == 'umapi':
         data_connector = sign_sync.connections.umapi_connection.Umapi(log_file)
     elif sign_obj.connector == 'azure':
-        data_connector = sign_sync.connections.azure_connection.Azure()
+        data_connector = sign_sync.connections.azure_connection.Azure(log_file, sign_obj.transport)
 
     run(log_file, sign_obj, sign_groups, data_connector)
 
@@ -41,7 +42,7 @@ def run(logs, sign_obj, sign_groups, connector):
     This is the run function of the application.
     :param logs: dict()
     :param sign_obj: dict()
-    :param sign_groups: list[]
+    :param sign_groups: GroupDirectory
     :param connector: dict()
     """
 
@@ -52,36 +53,76 @@ def run(logs, sign_obj, sign_groups, connector):
     # Get Users and Groups information from our connector
     group_list, user_list = get_data_from_connector(sign_obj, connector)
 
-    # Format the users and create groups that don't exist in Adobe Sign
-    LOGGER.update_progress('Sync Phase', 1 / 4)
-    user_that_exist_in_sign = sign_obj.check_user_existence(user_list)
-    user_to_be_updated = get_user_to_be_updated_list(sign_obj, user_that_exist_in_sign)
-    groups_not_found_in_sign = [group for group in group_list if group not in sign_groups]
-    if groups_not_found_in_sign:
-        sign_obj.create_sign_group(group_list, LOGGER)
-
-    # Sync users into their groups
-    LOGGER.update_progress('Sync Phase', 2 / 4)
-    do_threading(user_to_be_updated, sign_obj.process_user)
-
-    # This is when we will start the deactivation phase
-    LOGGER.update_progress('Sync Phase', 3 / 4)
-    sign_users = sign_obj.get_sign_users()
-    active_sign_user_list = do_threading_with_return(sign_users, sign_obj.get_active_user_list)
-
-    deactivate_list = []
-    for target_user in active_sign_user_list:
-        if not any(user['email'].lower() == target_user['email'].lower() for user in user_that_exist_in_sign):
-            deactivate_list.append(target_user)
-
-    if len(deactivate_list) > 0:
-        do_threading(deactivate_list, sign_obj.deactivate_users)
+    # Nothing to do when an incremental connector found no changes since the last sync
+    if not getattr(connector, 'changed', True):
+        # The connector still advanced its position in the directory (the LDAP USN or the Azure delta links),
+        # which has to be kept for the next sync
+        if sign_obj.connector in ('ldap', 'azure'):
+            connector.save_sync_state()
+        logs['process'].info('-- No Changes Found Since Last Sync --')
+        print('-- Execution Time: {} --'.format(time.time() - start_time))
+        logs['process'].info('------------------------------- Ending Sign Sync ---------------------------------')
+        return
+
+    pool, target = get_executor(sign_obj)
+
+    try:
+        # Format the users and create groups that don't exist in Adobe Sign
+        LOGGER.update_progress('Sync Phase', 1 / 4)
+        reconciler = sign_sync.reconciliation.Reconciler(user_list, [sign_obj.email])
+        user_that_exist_in_sign = sign_obj.check_user_existence(reconciler)
+        user_to_be_updated = get_user_to_be_updated_list(sign_obj, user_that_exist_in_sign)
+        changed_keys = getattr(connector, 'changed_keys', None)
+        if changed_keys is not None:
+            # The connector reported which users changed, so only they have to be synced
+            user_to_be_updated = [user for user in user_to_be_updated if user.key in changed_keys]
+        groups_not_found_in_sign = [group for group in dict.fromkeys(group_list) if group not in sign_groups]
+        if groups_not_found_in_sign:
+            LOGGER.update_progress('Creating Groups', 0)
+            existing_groups = do_threading(pool, groups_not_found_in_sign, target.create_sign_group, 'groups')
+            if existing_groups:
+                sign_obj.resolve_existing_groups(existing_groups)
+            LOGGER.update_progress('Creating Groups', 1)
+
+        # Sync users into their groups
+        LOGGER.update_progress('Sync Phase', 2 / 4)
+        do_threading(pool, user_to_be_updated, target.reactivate_user, 'reactivate')
+        do_threading(pool, user_to_be_updated, target.process_user, 'sync')
+
+        # This is when we will start the deactivation phase
+        LOGGER.update_progress('Sync Phase', 3 / 4)
+        candidates = reconciler.iter_deactivation_candidates(sign_obj.snapshot.iter_users())
+        deactivate_list = do_threading(pool, candidates, target.get_active_user_list, 'status')
+
+        if len(deactivate_list) > 0:
+            do_threading(pool, deactivate_list, target.deactivate_users, 'deactivate')
+    except requests.exceptions.HTTPError as err:
+        # Without the complete list of SIGN users the sync can't tell which users exist, so it stops here
+        logs['error'].error('!! Sync Aborted !! {}'.format(err))
+        print('-- Sync Aborted: {} --'.format(err))
+        return
+    finally:
+        pool.shutdown()
 
     # Save to cache file
     if sign_obj.cache_mode:
         save_cache(sign_obj, user_that_exist_in_sign)
+        sign_obj.status_cache.save()
+    if sign_obj.connector in ('ldap', 'azure'):
+        connector.save_sync_state()
 
     LOGGER.update_progress('Sync Phase', 4/4)
+    stats = sign_obj.transport.get_stats()
+    logs['process'].info('-- HTTP Requests: {} Connections Opened: {} Connections Reused: {} --'.format(
+        stats['requests'], stats['connections'], stats['reused']))
+    logs['process'].info('-- User Updates: {} Written, {} Skipped As Unchanged --'.format(
+        sign_obj.write_counts['written'], sign_obj.write_counts['skipped']))
+    counts = sign_obj.status_cache.get_counts()
+    logs['process'].info('-- User Status: {} Fetched, {} Not Modified, {} From Cache, {} From Listing --'.format(
+        counts['fetched'], counts['not_modified'], counts['cached'], counts['listing']))
+    metrics = sign_obj.limiter.get_metrics()
+    logs['process'].info('-- Concurrency Limit: {} (lowest {}, highest {}) Throttled: {} Retries: {} --'.format(
+        metrics['limit'], metrics['lowest_limit'], metrics['highest_limit'], metrics['throttled'], metrics['retries']))
     print('-- Execution Time: {} --'.format(time.time() - start_time))
     logs['process'].info('------------------------------- Ending Sign Sync ---------------------------------')
 
@@ -102,58 +143,68 @@ def get_data_from_connector(sign_obj, data_connector):
         group_list = data_connector.query_user_groups()
         user_list = data_connector.query_users_in_groups(sign_obj.get_product_profile(), sign_obj.account_type)
     elif sign_obj.connector == 'ldap':
-        group_list = data_connector.get_ldap_groups_query(sign_obj, LOGGER)
-        temp_list = data_connector.get_ldap_users_in_groups(group_list, sign_obj, LOGGER)
+        if data_connector.incremental_mode:
+            # The groups come from the saved state; they are only listed again on a full resync
+            group_list, user_list = data_connector.get_ldap_data_incremental(sign_obj, LOGGER)
+        elif data_connector.nested_groups:
+            group_list = data_connector.get_ldap_groups_query(sign_obj, LOGGER)
+            user_list = data_connector.get_ldap_users_nested(group_list, sign_obj.groups, LOGGER)
+        elif data_connector.bulk_mode:
+            group_list = data_connector.get_ldap_groups_query(sign_obj, LOGGER)
+            user_list = data_connector.get_ldap_users_bulk(group_list, sign_obj.groups, LOGGER)
+        else:
+            group_list = data_connector.get_ldap_groups_query(sign_obj, LOGGER)
+            temp_list = data_connector.iter_group_members(group_list, sign_obj, LOGGER)
+            user_list = data_connector.ldap_user_mp(temp_list, sign_obj.groups, LOGGER)
         group_list = data_connector.check_group_mapping(group_list, sign_obj.groups)
-        user_list = data_connector.ldap_user_mp(temp_list, sign_obj.groups, LOGGER)
     elif sign_obj.connector == 'azure':
-        group_list = data_connector.get_azure_groups_formatted(sign_obj.groups, LOGGER)
-        user_list = data_connector.create_user_json(sign_obj.email, sign_obj.groups, LOGGER)
+        if data_connector.delta_mode:
+            group_list, user_list = data_connector.get_azure_data_delta(sign_obj.email, sign_obj.groups, LOGGER)
+        else:
+            group_list = data_connector.get_azure_groups_formatted(sign_obj.groups, LOGGER)
+            user_list = data_connector.create_user_json(sign_obj.email, sign_obj.groups, LOGGER)
 
     return group_list, user_list
 
 
-def do_threading(user_list, func):
+def get_executor(sign_obj):
     """
-    This function will be start up a threading process.
-    :param user_list: list[]
-    :param func: FUNCTION
-    :return:
+    This function returns the executor for the Sign phases together with the object whose methods it runs. That is
+    either the worker pool with the Sign object or the asyncio engine, depending on the execution mode.
+    :param sign_obj: Sign
+    :return: WorkerPool or AsyncSign, Sign or AsyncSign
     """
 
-    queue = Queue()
-    for x in range(200):
-        worker = sign_sync.thread_functions.ThreadWorker(queue, func)
-        worker.start()
+    if sign_obj.execution_mode == 'async':
+        # The async engine and aiohttp are only loaded when they are used, so the threads mode runs without them
+        sign_async = importlib.import_module('sign_sync.connections.sign_async')
 
-    for user in user_list:
-        queue.put(user)
+        if sign_async.AsyncSign.is_available():
+            engine = sign_async.AsyncSign(sign_obj)
+            return engine, engine
+        LOGGER.get_log()['error'].error('-- aiohttp is not installed, falling back to threads --')
 
-    queue.join()
+    return sign_sync.thread_functions.WorkerPool(sign_obj.worker_count, sign_obj.phase_workers), sign_obj
 
 
-def do_threading_with_return(user_list, func):
+def do_threading(pool, user_list, func, phase=None):
     """
-    This function will start up a Thread process and be able to return a list.
+    This function will run func for every user on the worker pool and return the results that aren't empty.
+    Errors raised by func are written to the error log.
+    :param pool: WorkerPool or AsyncSign
     :param user_list: list[]
     :param func: FUNCTION
+    :param phase: str
     :return: list[]
     """
 
-    queue = Queue()
-    return_queue = Queue()
-    for x in range(200):
-        worker = sign_sync.thread_functions.ThreadWithReturnValue(queue, return_queue, func)
-        worker.start()
+    results, errors = pool.map(func, user_list, phase)
 
-    for user in user_list:
-        queue.put(user)
+    for user, error in errors:
+        name = user.get('email') if isinstance(user, dict) else getattr(user, 'email', user)
+        LOGGER.get_log()['error'].error('!! Worker Error !! {}: {!r}'.format(name, error))
 
-    queue.join()
-
-    return_list = list(return_queue.queue)
-
-    return return_list
+    return [result for result in results if result is not None]
 
 
 def get_user_to_be_updated_list(sign_obj, temp_user_list):
@@ -165,37 +216,18 @@ def get_user_to_be_updated_list(sign_obj, temp_user_list):
     :return: list[]
     """
 
-    file_path = 'cache/user_cache_{}.json'.format(sign_obj.connector)
+    user_cache = sign_sync.sync_cache.UserCache(sign_obj.connector)
 
-    if os.path.isfile(file_path) and sign_obj.cache_mode:
-        user_to_be_updated = do_threading_with_return(temp_user_list, find_difference)
+    if user_cache.exists() and sign_obj.cache_mode:
+        user_to_be_updated, changes = user_cache.find_difference(temp_user_list)
+        for email, fields in changes.items():
+            sign_obj.logs['process'].info('-- Changed Since Last Sync -- {}: {}'.format(email, ', '.join(fields)))
     else:
         user_to_be_updated = temp_user_list
 
     return user_to_be_updated
 
 
-def find_difference(user, difference_list):
-    """
-    This function will find the difference between the current sync and the previous sync state.
-    :param user: dict()
-    :param difference_list: list[]
-    :return: list[dict()]
-    """
-
-    file_path = 'cache/user_cache_ldap.json'
-
-    if os.path.isfile(file_path):
-        cache = load_cache(file_path)
-    else:
-        cache = load_cache('cache/user_cache_umapi.json')
-
-    if user not in cache:
-        difference_list.put(user)
-
-    return difference_list
-
-
 def save_cache(sign_obj, user_list):
     """
     This function will save the cache file.
@@ -203,22 +235,7 @@ def save_cache(sign_obj, user_list):
     :param user_list: list[]
     """
 
-    file_path = 'cache/user_cache_{}.json'.format(sign_obj.connector)
-    with open(file_path, 'w') as file:
-        json.dump(user_list, file)
-
-
-def load_cache(file_path):
-    """
-    This function will load the cache from the previous sync state.
-    :param file_path: str()
-    """
-
-    file_path = file_path
-    with open(file_path, 'r') as file:
-        json_data = json.load(file)
-
-    return json_data
+    sign_sync.sync_cache.UserCache(sign_obj.connector).save(user_list)
 
 
 def update_progress(job_title, progress):
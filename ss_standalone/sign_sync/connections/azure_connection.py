@@ -2,13 +2,28 @@ from adal import AuthenticationContext
 import requests
 import yaml
 
+import sign_sync.connections.graph_batch
+import sign_sync.connections.http_transport
+import sign_sync.sync_cache
+import sign_sync.user_record
+
+
+# The fields of users and groups the sync maps
+USER_FIELDS = ['id', 'mail', 'givenName', 'surname', 'userPrincipalName', 'displayName']
+GROUP_FIELDS = ['id', 'displayName']
+
 
 class Azure:
 
-    def __init__(self, logs=None):
+    def __init__(self, logs=None, transport=None):
 
         self.logs = logs
 
+        # Share the pooled connections of the caller if one was given
+        if transport is None:
+            transport = sign_sync.connections.http_transport.HttpTransport()
+        self.transport = transport
+
         # create config file
         with open("config/connector-azure.yml") as stream:
             try:
@@ -19,6 +34,25 @@ class Azure:
         self.tenant = self.azure_config_yml['tenant']
         self.client_id = self.azure_config_yml['client_id']
         self.client_secret = self.azure_config_yml['client_secret']
+        self.page_size = self.azure_config_yml.get('page_size') or 999
+
+        # read group membership settings
+        self.group_centric = self.azure_config_yml.get('group_centric', False)
+        self.transitive_members = self.azure_config_yml.get('transitive_members', False)
+        self.group_ids = dict()
+
+        # read batch settings
+        self.batch_requests = self.azure_config_yml.get('batch_requests', True)
+        self.batch_workers = self.azure_config_yml.get('batch_workers') or 4
+
+        # read delta query settings
+        self.delta_mode = self.azure_config_yml.get('delta_mode', False)
+        self.delta_state = sign_sync.sync_cache.AzureDeltaState()
+        self.changed = True
+        self.changed_keys = None
+
+        if self.delta_mode:
+            self.delta_state.load()
 
         self.token = self.authenticate_device_code()
 
@@ -29,6 +63,9 @@ class Azure:
             'Content-Type': 'application/json'
         }
 
+        self.batch = sign_sync.connections.graph_batch.GraphBatch(self.transport, self.header, self.batch_workers,
+                                                                  logs=self.logs)
+
     def authenticate_device_code(self):
         """
         Authenticate the end-user using device auth.
@@ -46,22 +83,56 @@ class Azure:
 
         return token["accessToken"]
 
+    def get_graph_pages(self, url, params=None):
+        """
+        This function yields the objects of a Graph collection page by page. It follows @odata.nextLink until the
+        last page, so collections larger than one page aren't truncated.
+
+        https://docs.microsoft.com/en-us/graph/paging
+
+        :param url: str
+        :param params: dict()
+        :return: generator of dict()
+        """
+
+        while url is not None:
+            req = self.transport.get(url, headers=self.header, params=params)
+
+            if req.status_code != 200:
+                self.logs['error'].error('!! Graph Request Error !! {}'.format(url))
+                self.logs['error'].error('!! Reason !! {}'.format(req.reason))
+                req.raise_for_status()
+
+            data = req.json()
+
+            for item in data['value']:
+                yield item
+
+            # The next link already carries the query parameters
+            url = data.get('@odata.nextLink')
+            params = None
+
     def get_azure_users(self, sys_log=None):
         """
-        This function will get all user IDs within the directory targeting Adobe Sign Groups
+        This function will get all user IDs within the directory targeting Adobe Sign Groups. Only the fields the
+        sync maps are requested.
 
         https://docs.microsoft.com/en-us/graph/api/user-list?view=graph-rest-1.0&tabs=http
 
-        :return:
+        :return: generator of dict()
         """
 
-        req = requests.get("https://graph.microsoft.com/v1.0/users", headers=self.header)
+        params = {
+            '$top': self.page_size,
+            '$select': ','.join(USER_FIELDS)
+        }
 
-        data = req.json()
+        sys_log.update_progress('User Query', 0)
 
-        sys_log.update_progress('User Query', 1)
+        for user in self.get_graph_pages("https://graph.microsoft.com/v1.0/users", params):
+            yield user
 
-        return data
+        sys_log.update_progress('User Query', 1)
 
     def get_azure_groups(self):
         """
@@ -69,14 +140,15 @@ class Azure:
 
         https://docs.microsoft.com/en-us/graph/api/group-list?view=graph-rest-1.0&tabs=http
 
-        :return: Object{}
+        :return: generator of dict()
         """
 
-        req = requests.get("https://graph.microsoft.com/v1.0/groups", headers=self.header)
-
-        data = req.json()
+        params = {
+            '$top': self.page_size,
+            '$select': ','.join(GROUP_FIELDS)
+        }
 
-        return data
+        return self.get_graph_pages("https://graph.microsoft.com/v1.0/groups", params)
 
     def get_azure_groups_formatted(self, group_mapping, sys_log=None):
         """
@@ -86,10 +158,10 @@ class Azure:
 
         group_list = []
 
-        data = self.get_azure_groups()
+        sys_log.update_progress('Group Query', 0)
 
-        for count, group in enumerate(data['value']):
-            sys_log.update_progress('Group Query', count / len(data['value']))
+        for group in self.get_azure_groups():
+            self.group_ids[group['displayName']] = group['id']
             if group['displayName'] == "SIGN_ACCOUNT_ADMIN" or group['displayName'] == "SIGN_GROUP_ADMIN":
                 pass
             else:
@@ -104,43 +176,114 @@ class Azure:
 
     def create_user_json(self, sign_account_email, group_mapping, sys_log=None):
         """
-        This function creates the user JSON matching the schmea with the other connectors.
+        This function creates the user records matching the ones of the other connectors.
 
-        :return: Object{}
+        :return: list[UserRecord]
         """
 
+        if self.group_centric:
+            return self.create_user_json_from_groups(sign_account_email, group_mapping, sys_log)
+
         data = self.get_azure_users(sys_log)
+        users = [user for user in data if user['userPrincipalName'] != sign_account_email]
 
         user_json = []
 
-        for count, user in enumerate(data['value']):
-            sys_log.update_progress('Formatting Users', count / len(data['value']))
-            if user['userPrincipalName'] == sign_account_email:
-                pass
-            else:
-                # Format it to an a standardize json format
-                temp = {
-                    "email": user['mail'],
-                    "firstname": user['givenName'],
-                    "groups": self.check_group_mapping(user['id'], group_mapping),
-                    "lastname": user['surname'],
-                    "username": user['mail'],
-                }
-
-                user_json.append(temp)
+        # Look up the groups of the users in $batch requests, or one user at a time
+        if self.batch_requests:
+            member_of = self.get_users_member_of([user['id'] for user in users])
+        else:
+            member_of = (self.get_user_member_of(user['id']) for user in users)
+
+        for user, groups in zip(users, member_of):
+            # Format it to a standardized user record
+            temp = sign_sync.user_record.UserRecord(user['mail'], user['givenName'], user['surname'],
+                                                    self.map_groups(groups, group_mapping))
+
+            user_json.append(temp)
         sys_log.update_progress('Formatting Users', 1)
 
         return user_json
 
-    def check_group_mapping(self, user_id, group_mapping):
+    def create_user_json_from_groups(self, sign_account_email, group_mapping, sys_log=None):
+        """
+        This function creates the user records from the members of the mapped groups instead of asking for the
+        groups of every user. The memberships are inverted locally, so the number of requests depends on the number
+        of mapped groups and users outside of them are never fetched. The admin groups only add roles to the users
+        of the mapped groups. Users outside of the mapped groups aren't source users, so they are deactivated in
+        SIGN, unlike with the listing of every user in the directory.
+        :param sign_account_email: str
+        :param group_mapping: dict()
+        :param sys_log: LOGGER
+        :return: list[UserRecord]
+        """
+
+        admin_groups = ["SIGN_ACCOUNT_ADMIN", "SIGN_GROUP_ADMIN"]
+        users = dict()
+        user_groups = dict()
+
+        if not self.group_ids:
+            self.group_ids = dict((group['displayName'], group['id']) for group in self.get_azure_groups())
+
+        # The name each targeted group has in SIGN
+        targets = dict()
+        for group_name, group_id in self.group_ids.items():
+            if group_name in admin_groups or not group_mapping:
+                targets[group_id] = group_name
+            elif group_name in group_mapping:
+                targets[group_id] = group_mapping[group_name]
+
+        for count, (group_id, sign_group) in enumerate(targets.items()):
+            sys_log.update_progress('User Query', count / len(targets))
+            for user in self.get_group_members(group_id):
+                if user['userPrincipalName'] == sign_account_email:
+                    continue
+                users.setdefault(user['id'], user)
+                user_groups.setdefault(user['id'], []).append(sign_group)
+        sys_log.update_progress('User Query', 1)
+
+        user_json = []
+
+        for user_id, groups in user_groups.items():
+            # Users that are only in the admin groups aren't synced
+            if all(group in admin_groups for group in groups):
+                continue
+
+            user = users[user_id]
+            user_json.append(sign_sync.user_record.UserRecord(user['mail'], user['givenName'], user['surname'],
+                                                              groups))
+
+        return user_json
+
+    def get_group_members(self, group_id):
+        """
+        This function yields the users that are a member of a group. Members of nested groups are included when
+        transitive_members is set.
+
+        https://docs.microsoft.com/en-us/graph/api/group-list-transitivemembers?view=graph-rest-1.0&tabs=http
+
+        :param group_id: str
+        :return: generator of dict()
+        """
+
+        relation = 'transitiveMembers' if self.transitive_members else 'members'
+        params = {
+            '$top': self.page_size,
+            '$select': ','.join(USER_FIELDS)
+        }
+
+        return self.get_graph_pages("https://graph.microsoft.com/v1.0/groups/{}/{}/microsoft.graph.user".format(
+            group_id, relation), params)
+
+    @staticmethod
+    def map_groups(temp_groups, group_mapping):
         """
-        This function checks to see if group mapping is enabled.
-        :param user_id: string
+        This function replaces the groups of a user with their mapping if group mapping is enabled.
+        :param temp_groups: list[]
         :param group_mapping: list()
-        :return:
+        :return: list[]
         """
 
-        temp_groups = self.get_user_member_of(user_id)
         group_list = list()
 
         if group_mapping:
@@ -162,7 +305,8 @@ class Azure:
 
         group_list = []
 
-        req = requests.get("https://graph.microsoft.com/v1.0/users/{}/memberOf".format(user_id), headers=self.header)
+        req = self.transport.get("https://graph.microsoft.com/v1.0/users/{}/memberOf".format(user_id),
+                                 headers=self.header)
 
         data = req.json()
 
@@ -171,3 +315,197 @@ class Azure:
 
         # TODO check for multiple groups
         return group_list
+
+    def get_users_member_of(self, user_ids):
+        """
+        This function gets the groups of many users at once. The memberOf requests are sent in $batch requests of
+        20, and the groups of a user that span more than one page are read with the pager.
+        :param user_ids: list[]
+        :return: list[list[]]
+        """
+
+        paths = ['/users/{}/memberOf?$select=displayName'.format(user_id) for user_id in user_ids]
+        group_lists = []
+
+        for data in self.batch.get_all(paths):
+            groups = [group['displayName'] for group in data['value']]
+            if '@odata.nextLink' in data:
+                groups.extend(group['displayName'] for group in self.get_graph_pages(data['@odata.nextLink']))
+            group_lists.append(groups)
+
+        stats = self.batch.get_stats()
+        self.logs['process'].info('-- Graph Batch: {} Requests In {} Round Trips, {} Retried --'.format(
+            stats['requests'], stats['batches'], stats['retries']))
+
+        return group_lists
+
+    def get_azure_data_delta(self, sign_account_email, group_mapping, sys_log=None):
+        """
+        This function returns the groups and users of the directory from the saved delta state, after applying the
+        changes Graph reports since the previous sync. The names of the users that changed are kept in
+        changed_keys, so only they have to be synced. The state is saved by save_sync_state once the sync is done.
+        :param sign_account_email: str
+        :param group_mapping: dict()
+        :param sys_log: LOGGER
+        :return: list[], list[UserRecord]
+        """
+
+        state = self.delta_state
+        full_sync = state.user_delta_link is None or state.group_delta_link is None
+
+        sys_log.update_progress('User Query', 0)
+        try:
+            user_changes, group_changes = self.get_delta_changes()
+        except requests.exceptions.HTTPError:
+            if full_sync:
+                raise
+            # The delta links expired, so start over with a full delta query
+            self.logs['process'].info('-- Azure Delta Links Expired, Reading All Users --')
+            state.reset()
+            full_sync = True
+            user_changes, group_changes = self.get_delta_changes()
+        sys_log.update_progress('User Query', 1)
+
+        changed_ids = self.apply_user_changes(user_changes) | self.apply_group_changes(group_changes)
+        mapping_changed = state.group_map != group_mapping
+        state.group_map = group_mapping
+
+        self.changed = full_sync or mapping_changed or bool(changed_ids)
+        self.logs['process'].info('-- Azure Delta: {} Changed Users And Memberships --'.format(len(changed_ids)))
+
+        # Format the groups the same way get_azure_groups_formatted does
+        group_list = []
+        for group in state.groups.values():
+            if group['displayName'] == "SIGN_ACCOUNT_ADMIN" or group['displayName'] == "SIGN_GROUP_ADMIN":
+                continue
+            if not group_mapping:
+                group_list.append(group['displayName'])
+            elif group['displayName'] in group_mapping:
+                group_list.append(group_mapping[group['displayName']])
+
+        user_groups = state.get_user_groups()
+        user_json = []
+        changed_keys = set()
+
+        for user_id, user in state.users.items():
+            if user.get('userPrincipalName') == sign_account_email:
+                continue
+
+            temp = sign_sync.user_record.UserRecord(user.get('mail'), user.get('givenName'), user.get('surname'),
+                                                    self.map_groups(user_groups.get(user_id, []), group_mapping))
+            user_json.append(temp)
+
+            if user_id in changed_ids:
+                changed_keys.add(temp.key)
+
+        # Every user has to be synced after a full read or a change of the group mapping
+        self.changed_keys = None if full_sync or mapping_changed else changed_keys
+
+        return group_list, user_json
+
+    def get_delta_changes(self):
+        """
+        This function asks Graph for the user and group changes since the saved delta links. Both first pages are
+        requested in a single $batch round trip; further pages are followed until the new delta links.
+        :return: list[dict()], list[dict()]
+        """
+
+        state = self.delta_state
+        graph_url = sign_sync.connections.graph_batch.GRAPH_URL
+
+        user_path = '/users/delta?$select={}'.format(','.join(USER_FIELDS))
+        group_path = '/groups/delta?$select=displayName,members'
+
+        if state.user_delta_link is not None:
+            user_path = state.user_delta_link[len(graph_url):]
+        if state.group_delta_link is not None:
+            group_path = state.group_delta_link[len(graph_url):]
+
+        user_page, group_page = self.batch.get_all([user_path, group_path])
+        user_changes, state.user_delta_link = self.follow_delta(user_page)
+        group_changes, state.group_delta_link = self.follow_delta(group_page)
+
+        return user_changes, group_changes
+
+    def follow_delta(self, data):
+        """
+        This function collects the changes of a delta query, following @odata.nextLink until the page that carries
+        the @odata.deltaLink for the next sync.
+        :param data: dict()
+        :return: list[dict()], str
+        """
+
+        changes = list(data['value'])
+
+        while '@odata.nextLink' in data:
+            req = self.transport.get(data['@odata.nextLink'], headers=self.header)
+            req.raise_for_status()
+            data = req.json()
+            changes.extend(data['value'])
+
+        return changes, data.get('@odata.deltaLink')
+
+    def apply_user_changes(self, changes):
+        """
+        This function applies the user changes of a delta query to the state. Graph only returns the properties that
+        changed, so they are merged into the saved user.
+        :param changes: list[dict()]
+        :return: set()
+        """
+
+        changed_ids = set()
+
+        for user in changes:
+            if '@removed' in user:
+                self.delta_state.users.pop(user['id'], None)
+            else:
+                entry = self.delta_state.users.setdefault(user['id'], dict())
+                entry.update((field, user[field]) for field in USER_FIELDS if field in user and field != 'id')
+            changed_ids.add(user['id'])
+
+        return changed_ids
+
+    def apply_group_changes(self, changes):
+        """
+        This function applies the group changes of a delta query to the state and returns the users whose groups
+        changed. Only users are kept as members.
+        :param changes: list[dict()]
+        :return: set()
+        """
+
+        changed_ids = set()
+
+        for group in changes:
+            if '@removed' in group:
+                removed = self.delta_state.groups.pop(group['id'], None)
+                if removed is not None:
+                    changed_ids.update(removed['members'])
+                continue
+
+            entry = self.delta_state.groups.setdefault(group['id'], {'displayName': None, 'members': []})
+            members = set(entry['members'])
+
+            if 'displayName' in group and group['displayName'] != entry['displayName']:
+                entry['displayName'] = group['displayName']
+                changed_ids.update(members)
+
+            for member in group.get('members@delta', []):
+                if member.get('@odata.type', '#microsoft.graph.user') != '#microsoft.graph.user':
+                    continue
+                if '@removed' in member:
+                    members.discard(member['id'])
+                else:
+                    members.add(member['id'])
+                changed_ids.add(member['id'])
+
+            entry['members'] = sorted(members)
+
+        return changed_ids
+
+    def save_sync_state(self):
+        """
+        This function saves the delta state after a sync has completed.
+        """
+
+        if self.delta_mode:
+            self.delta_state.save()
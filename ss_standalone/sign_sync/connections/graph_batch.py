@@ -0,0 +1,143 @@
+import threading
+import time
+
+import requests
+
+import sign_sync.connections.rate_limiter
+import sign_sync.thread_functions
+
+GRAPH_URL = 'https://graph.microsoft.com/v1.0'
+
+# Microsoft Graph accepts at most 20 sub-requests per $batch request
+BATCH_SIZE = 20
+
+
+class GraphBatch:
+
+    def __init__(self, transport, header, workers=4, max_retries=3, backoff=1.0, logs=None):
+        """
+        The batch packs Graph GET requests into JSON $batch requests of up to 20 sub-requests and sends the batches
+        concurrently. Sub-requests that are throttled are sent again in a later batch after their Retry-After.
+
+        https://docs.microsoft.com/en-us/graph/json-batching
+
+        :param transport: HttpTransport
+        :param header: dict()
+        :param workers: int
+        :param max_retries: int
+        :param backoff: float
+        :param logs: dict()
+        """
+
+        self.transport = transport
+        self.header = header
+        self.workers = workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.logs = logs
+        self.lock = threading.Lock()
+        self.stats = {
+            'requests': 0,
+            'batches': 0,
+            'retries': 0
+        }
+
+    def get_all(self, paths):
+        """
+        This function runs a GET request for every path, relative to the Graph version root, and returns the
+        response bodies in the same order. Paths that still fail after the retries raise an HTTPError, so a partial
+        result is never mistaken for a complete one.
+        :param paths: list[]
+        :return: list[dict()]
+        """
+
+        results = [None] * len(paths)
+        pending = list(range(len(paths)))
+        failed = []
+        attempt = 0
+        pool = sign_sync.thread_functions.WorkerPool(self.workers)
+
+        try:
+            while pending:
+                batches = [pending[i:i + BATCH_SIZE] for i in range(0, len(pending), BATCH_SIZE)]
+                responses, errors = pool.map(lambda batch: self.send_batch(batch, paths), batches)
+                throttled = []
+                delay = self.backoff * 2 ** attempt
+
+                for batch, error in errors:
+                    self.logs['error'].error('!! Graph Batch Error !! {!r}'.format(error))
+                    failed.extend(batch)
+
+                for items in responses:
+                    for index, status_code, body, retry_after in items:
+                        if status_code == 200:
+                            results[index] = body
+                        elif status_code in sign_sync.connections.rate_limiter.THROTTLE_STATUS_CODES:
+                            throttled.append(index)
+                            delay = max(delay, retry_after or 0)
+                        else:
+                            self.logs['error'].error('!! Graph Request Error !! {} ({})'.format(
+                                paths[index], status_code))
+                            failed.append(index)
+
+                if throttled and attempt >= self.max_retries:
+                    failed.extend(throttled)
+                    throttled = []
+                elif throttled:
+                    with self.lock:
+                        self.stats['retries'] += len(throttled)
+                    time.sleep(delay)
+
+                pending = sorted(throttled)
+                attempt += 1
+        finally:
+            pool.shutdown()
+
+        if failed:
+            raise requests.exceptions.HTTPError('{} Graph requests failed, first: {}'.format(
+                len(failed), paths[min(failed)]))
+
+        return results
+
+    def send_batch(self, batch, paths):
+        """
+        This function sends one $batch request and returns the outcome of each of its sub-requests. A batch that is
+        throttled as a whole is reported as throttled for every sub-request.
+        :param batch: list[int]
+        :param paths: list[]
+        :return: list[(int, int, dict(), float)]
+        """
+
+        payload = {
+            'requests': [{'id': str(index), 'method': 'GET', 'url': paths[index]} for index in batch]
+        }
+
+        res = self.transport.post(GRAPH_URL + '/$batch', headers=self.header, json=payload)
+
+        with self.lock:
+            self.stats['batches'] += 1
+            self.stats['requests'] += len(batch)
+
+        if res.status_code in sign_sync.connections.rate_limiter.THROTTLE_STATUS_CODES:
+            retry_after = sign_sync.connections.rate_limiter.get_retry_after(res)
+            return [(index, res.status_code, None, retry_after) for index in batch]
+
+        res.raise_for_status()
+
+        items = []
+
+        for response in res.json()['responses']:
+            headers = dict((name.lower(), value) for name, value in (response.get('headers') or {}).items())
+            retry_after = sign_sync.connections.rate_limiter.parse_retry_after(headers.get('retry-after'))
+            items.append((int(response['id']), response['status'], response.get('body'), retry_after))
+
+        return items
+
+    def get_stats(self):
+        """
+        This function returns how many sub-requests were sent in how many round trips.
+        :return: dict()
+        """
+
+        with self.lock:
+            return dict(self.stats)
@@ -0,0 +1,143 @@
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+import requests.adapters
+
+import sign_sync.connections.rate_limiter
+
+
+class HttpTransport:
+
+    def __init__(self, pool_size=10, timeout=None):
+        """
+        The transport keeps a pool of keep-alive connections that is shared by all threads. Each thread gets its own
+        session, but every session is mounted on the same connection pool.
+        :param pool_size: int
+        :param timeout: float
+        """
+
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size,
+                                                     pool_block=True)
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.request_count = 0
+        self.limiters = dict()
+
+    def get_session(self):
+        """
+        This function returns the session of the current thread.
+        :return: requests.Session
+        """
+
+        session = getattr(self.local, 'session', None)
+
+        if session is None:
+            session = requests.Session()
+            session.mount('https://', self.adapter)
+            session.mount('http://', self.adapter)
+            self.local.session = session
+
+        return session
+
+    def add_limiter(self, host, limiter):
+        """
+        This function puts an adaptive limiter in front of every request to a host.
+        :param host: str
+        :param limiter: AdaptiveLimiter
+        """
+
+        self.limiters[host] = limiter
+
+    def request(self, method, url, **kwargs):
+        """
+        This function sends a request over the pooled connections. The default timeout is applied unless the caller
+        passes one. If the host has a limiter, throttled requests are sent again once the Retry-After window passed.
+        :param method: str
+        :param url: str
+        :return: requests.Response
+        """
+
+        kwargs.setdefault('timeout', self.timeout)
+        limiter = self.limiters.get(urlparse(url).hostname)
+
+        if limiter is None:
+            return self.send(method, url, **kwargs)
+
+        attempt = 0
+        while True:
+            limiter.acquire()
+            start = time.time()
+
+            try:
+                res = self.send(method, url, **kwargs)
+            except requests.exceptions.RequestException:
+                limiter.release()
+                raise
+
+            limiter.release(res.status_code, time.time() - start,
+                            sign_sync.connections.rate_limiter.get_retry_after(res))
+
+            if res.status_code not in sign_sync.connections.rate_limiter.THROTTLE_STATUS_CODES \
+                    or attempt >= limiter.max_retries:
+                return res
+
+            attempt += 1
+            limiter.record_retry()
+
+    def send(self, method, url, **kwargs):
+        """
+        This function sends a single request with the session of the current thread.
+        :param method: str
+        :param url: str
+        :return: requests.Response
+        """
+
+        res = self.get_session().request(method, url, **kwargs)
+
+        with self.lock:
+            self.request_count += 1
+
+        return res
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request('PUT', url, **kwargs)
+
+    def get_stats(self):
+        """
+        This function returns how many requests were sent and how many connections had to be opened for them.
+        :return: dict()
+        """
+
+        pools = self.adapter.poolmanager.pools
+        connections = 0
+
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                connections += pool.num_connections
+
+        with self.lock:
+            request_count = self.request_count
+
+        return {
+            'requests': request_count,
+            'connections': connections,
+            'reused': max(request_count - connections, 0)
+        }
+
+    def close(self):
+        """
+        This function closes all pooled connections.
+        """
+
+        self.adapter.close()
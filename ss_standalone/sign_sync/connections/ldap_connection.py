@@ -1,8 +1,12 @@
 import ldap
 import ldap.controls.libldap
+import ldap.filter
 import yaml
+import collections
 import itertools
-import multiprocessing
+import time
+import sign_sync.sync_cache
+import sign_sync.user_record
 
 
 class LdapConfig:
@@ -26,8 +30,36 @@ class LdapConfig:
         self.username = self.ldap_config_yml["username"]
         self.password = self.ldap_config_yml["password"]
 
+        # read bulk query settings
+        self.bulk_mode = self.ldap_config_yml.get('bulk_mode', False)
+        self.bulk_group_batch = self.ldap_config_yml.get('bulk_group_batch') or 100
+        self.group_dns = dict()
+
+        # read nested group settings
+        self.nested_groups = self.ldap_config_yml.get('nested_groups', False)
+
+        # read connection pool settings
+        self.pool_size = self.ldap_config_yml.get('connection_pool_size') or 4
+        self.pipeline_depth = self.ldap_config_yml.get('pipeline_depth') or 50
+
+        # read incremental sync settings
+        self.incremental_mode = self.ldap_config_yml.get('incremental_mode', False)
+        self.full_resync_interval = self.ldap_config_yml.get('full_resync_interval') or 86400
+        self.sync_state = sign_sync.sync_cache.LdapSyncState(self.full_resync_interval)
+        self.changed = True
+
+        # The incremental reads only follow direct members, so users in nested groups would be dropped
+        if self.incremental_mode and self.nested_groups:
+            self.logs['error'].error('-- incremental_mode does not support nested_groups, '
+                                     'running a full nested group sync instead --')
+            self.incremental_mode = False
+
+        if self.incremental_mode:
+            self.sync_state.load()
+
         # connection
         self.conn = self.authenticate()
+        self.pool = self.create_pool()
 
     def get_conn(self):
         """
@@ -43,30 +75,103 @@ class LdapConfig:
         :return:
         """
 
+        self.conn = self.create_connection()
+
+        return self.conn
+
+    def create_connection(self):
+        """
+        This function creates a new connection and binds it to the LDAP server.
+        :return: LDAP connection
+        """
+
         # set options for LDAP connection
-        self.conn = ldap.initialize('{}'.format(self.address))
-        self.conn.protocol_version = 3
-        self.conn.set_option(ldap.OPT_REFERRALS, 0)
+        conn = ldap.initialize('{}'.format(self.address))
+        conn.protocol_version = 3
+        conn.set_option(ldap.OPT_REFERRALS, 0)
 
         # attempt to connect to the LDAP server
         try:
-            self.conn.simple_bind_s(self.username, self.password)
-            return self.conn
+            conn.simple_bind_s(self.username, self.password)
+            return conn
         except ldap.INVALID_CREDENTIALS:
             self.logs['error'].error("Invalid LDAP Credentials...")
         except ldap.SERVER_DOWN:
             self.logs['error'].error("Server Is Down...")
 
+    def create_pool(self):
+        """
+        This function creates the pool of bound connections used for pipelined searches. The main connection is
+        part of the pool.
+        :return: list[]
+        """
+
+        pool = [self.conn]
+
+        for x in range(self.pool_size - 1):
+            conn = self.create_connection()
+            if conn is not None:
+                pool.append(conn)
+
+        return [conn for conn in pool if conn is not None]
+
     def disconnect(self):
         """
         This function will disconnect the application from the LDAP server
         :return:
         """
 
+        for conn in self.pool:
+            try:
+                conn.unbind_s()
+            except Exception:
+                self.logs['error'].error("Failed to unbind from LDAP server...")
+
+    def search_pipelined(self, searches):
+        """
+        This function runs many searches at once. Up to pipeline_depth searches are outstanding at any time, spread
+        over the connections of the pool with the asynchronous search_ext/result3 API. The results are returned in
+        the same order as the searches. If searches is a deque, searches appended to it while the results are being
+        consumed are run as well.
+        :param searches: iterable of (base_dn, scope, filter, attrlist)
+        :return: generator of ((base_dn, scope, filter, attrlist), list[])
+        """
+
+        connections = itertools.cycle(self.pool)
+        queue = searches if isinstance(searches, collections.deque) else None
+        searches = iter(searches) if queue is None else None
+        pending = collections.deque()
+
+        def submit():
+            if queue is not None:
+                search = queue.popleft() if queue else None
+            else:
+                search = next(searches, None)
+            if search is not None:
+                conn = next(connections)
+                base_dn, scope, search_filter, attrlist = search
+                pending.append((search, conn, conn.search_ext(base_dn, scope, search_filter, attrlist=attrlist)))
+
+            return search is not None
+
         try:
-            self.conn.unbind_s()
-        except Exception:
-            self.logs['error'].error("Failed to unbind from LDAP server...")
+            while True:
+                while len(pending) < self.pipeline_depth and submit():
+                    pass
+                if not pending:
+                    break
+
+                search, conn, msgid = pending.popleft()
+                try:
+                    result_type, result_data, _rmsgid, serverctrls = conn.result3(msgid)
+                except ldap.NO_SUCH_OBJECT:
+                    result_data = []
+
+                yield search, result_data
+        except GeneratorExit:
+            for search, conn, msgid in pending:
+                conn.abandon(msgid)
+            raise
 
     def get_base_dn_setting(self):
         """
@@ -88,156 +193,407 @@ class LdapConfig:
         ignore_groups = ['SIGN_GROUP_ADMIN', 'SIGN_ACCOUNT_ADMIN']
         group_list = list()
 
-        # Query for a list and decode each group to a str
-        group_query = self.get_ldap_query_paged(new_base_dn)
+        # Query for the groups page by page and decode each group to a str
+        sys_log.update_progress('Group Query', 0)
+        group_query = self.get_ldap_query_paged(new_base_dn, attrlist=['cn', 'name'])
 
-        for count, group in enumerate(group_query):
-            sys_log.update_progress('Group Query', count / len(group_query))
+        for group in group_query:
+            if group[0] is None:
+                continue
             if group[1]['name'][0].decode('utf-8') not in ignore_groups and 'cn' in group[1]:
                 group_list.append(group[1]['cn'][0].decode('utf-8'))
+                self.group_dns[group_list[-1]] = group[0]
         sys_log.update_progress('Group Query', 1)
 
         return group_list
 
-    def get_ldap_users_in_groups(self, groups, sign_obj, sys_log=None):
+    def iter_group_members(self, groups, sign_obj, sys_log=None):
         """
-        This function will return a list of users within all targeted groups.
+        This function yields the member DNs of all targeted groups as soon as each group or range arrives. The
+        groups are queried in parallel, and the ranges of groups with 1500+ members are requested as soon as the
+        previous range of that group arrives, so the ranges of different groups are retrieved concurrently. A group
+        that is reached more than once is only retrieved once.
         :param groups: list[]
         :param sign_obj: dict()
         :param sys_log: LOGGER
-        :return: list[]
+        :return: generator of bytes
+        """
+
+        for group, member in self.iter_group_member_pairs(groups, sign_obj, sys_log):
+            yield member
+
+    def iter_group_member_pairs(self, groups, sign_obj, sys_log=None):
+        """
+        This function works like iter_group_members, but yields each member DN together with the name of the group
+        it was found in.
+        :param groups: list[]
+        :param sign_obj: dict()
+        :param sys_log: LOGGER
+        :return: generator of (str, bytes)
         """
 
         new_base_dn = 'OU={}, {}'.format(sign_obj.get_adobe_ou(), self.base_dn)
-        user_list = []
-        temp_name = ""
+        unique_groups = dict()
+        group_names = dict()
+        completed = 0
+
+        for group in groups:
+            unique_groups.setdefault(group.lower(), ("(CN={})".format(group), group))
+
+        group_filters = dict(unique_groups.values())
 
         # Query each group to find the users in each group
-        for i, group in enumerate(groups):
-            sys_log.update_progress('User Query', i / len(groups))
-            user_in_group = self.conn.search_s(new_base_dn, ldap.SCOPE_SUBTREE, "(CN={})".format(group),
-                                               attrlist=['member'])
-            group_dn = user_in_group[0][0]
-            user_in_group = user_in_group[0][1]
-
-            # This is the option if there's 1500+ users in a group
-            if len(user_in_group) == 2:
-                for attr_name in user_in_group:
-                    if ';range=' in attr_name:
-                        actual_attr_name, range_stmt = attr_name.split(';')
-                        bound_lower, bound_upper = [
-                            int(x) for x in range_stmt.split('=')[1].split('-')
-                        ]
-
-                        step = bound_upper - bound_lower + 1
-
-                        while True:
-                            attr_next = '%s;range=%d-%d' % (
-                                actual_attr_name, bound_lower, bound_upper
-                            )
-                            temp_dict = self.conn.search_s(group_dn, ldap.SCOPE_SUBTREE, attrlist=[attr_next])
-                            temp_dict = temp_dict[0][1]
-
-                            for temp_attr in temp_dict:
-                                temp_name = temp_attr
-                                user_list.append(temp_dict[temp_name])
-
-                            if temp_name.endswith('-*'):
-                                break
-
-                            bound_lower = bound_upper + 1
-                            bound_upper += step
-            elif not user_in_group:
-                pass
-            else:
-                user_list.append(user_in_group['member'])
+        searches = collections.deque((new_base_dn, ldap.SCOPE_SUBTREE, group_filter, ['member'])
+                                     for group_filter in group_filters)
+
+        for search, entries in self.search_pipelined(searches):
+            is_range = search[1] == ldap.SCOPE_BASE
+            entries = [entry for entry in entries if entry[0] is not None]
+            group_dn, attrs = entries[0] if entries else (None, {})
+
+            if not is_range and group_dn is not None:
+                if group_dn.lower() in group_names:
+                    attrs = {}
+                else:
+                    group_names[group_dn.lower()] = group_filters[search[2]]
+
+            finished = True
+            for attr_name, members in attrs.items():
+                # This is the option if there's 1500+ users in a group
+                if ';range=' in attr_name:
+                    state = self.get_next_range(attr_name)
+                    if state is not None:
+                        searches.append((group_dn, ldap.SCOPE_BASE, '(objectClass=*)', state))
+                        finished = False
+                elif attr_name != 'member':
+                    continue
+
+                group = group_names[group_dn.lower()]
+                for member in members:
+                    yield group, member
+
+            if finished:
+                completed += 1
+                if sys_log is not None:
+                    sys_log.update_progress('User Query', completed / len(unique_groups))
+
+        if sys_log is not None:
+            sys_log.update_progress('User Query', 1)
 
-        sys_log.update_progress('User Query', 1)
-        flatten_user_list = self.flatten_list(user_list)
+    @staticmethod
+    def get_next_range(attr_name):
+        """
+        This function returns the ranged attribute to request after the given one, or None if it was the last range.
+        :param attr_name: str
+        :return: list[]
+        """
 
-        return flatten_user_list
+        if attr_name.endswith('-*'):
+            return None
 
-    def get_ldap_query_paged(self, base_dn, target_object=None):
+        actual_attr_name, range_stmt = attr_name.split(';')
+        bound_lower, bound_upper = [int(x) for x in range_stmt.split('=')[1].split('-')]
+        step = bound_upper - bound_lower + 1
+
+        return ['%s;range=%d-%d' % (actual_attr_name, bound_upper + 1, bound_upper + step)]
+
+    def get_ldap_query_paged(self, base_dn, target_object=None, search_filter='(objectClass=*)', attrlist=None):
         """
-        This method will perform LDAP query in pages. The size limit can be set in the ldap.yml file.
+        This method will perform LDAP query in pages and yield the entries of each page as it arrives. The size
+        limit can be set in the ldap.yml file. Only the attributes in attrlist are requested, and the search is
+        abandoned if the caller stops before the last page.
         :param base_dn: str()
         :param target_object: str()
-        :return: list[]
+        :param search_filter: str()
+        :param attrlist: list[]
+        :return: generator of (str, dict())
         """
 
         connection = self.get_conn()
         search_page_size = self.ldap_config_yml['search_page_size']
-        query_list = []
 
         if target_object is None:
             target_object = '*'
 
-        msgid = None
-        try:
-            lc = ldap.controls.libldap.SimplePagedResultsControl(True, size=search_page_size, cookie='')
-
-            has_next_page = True
-            while has_next_page:
-                if msgid is not None:
-                    result_type, response_data, _rmsgid, serverctrls = connection.result3(msgid)
-                    query_list.append(response_data)
-                    msgid = None
-                    pctrls = [c for c in serverctrls
-                              if c.controlType == ldap.controls.libldap.SimplePagedResultsControl.controlType]
-                    if not pctrls:
-                        self.logs['process'].error("Server ignored RFC 2696 control...")
-                        has_next_page = False
-                    else:
-                        lc.cookie = cookie = pctrls[0].cookie
-                        if not cookie:
-                            has_next_page = False
-                if has_next_page:
-                    msgid = connection.search_ext(base_dn, ldap.SCOPE_SUBTREE, serverctrls=[lc])
-
-            merged_list = list(itertools.chain(*query_list))
-
-            return merged_list
+        lc = ldap.controls.libldap.SimplePagedResultsControl(True, size=search_page_size, cookie='')
+        msgid = connection.search_ext(base_dn, ldap.SCOPE_SUBTREE, search_filter, attrlist=attrlist,
+                                      serverctrls=[lc])
 
-        except GeneratorExit:
+        try:
+            while msgid is not None:
+                result_type, response_data, _rmsgid, serverctrls = connection.result3(msgid)
+                msgid = None
+
+                pctrls = [c for c in serverctrls
+                          if c.controlType == ldap.controls.libldap.SimplePagedResultsControl.controlType]
+                if not pctrls:
+                    self.logs['process'].error("Server ignored RFC 2696 control...")
+                elif pctrls[0].cookie:
+                    # Request the next page before handing out this one
+                    lc.cookie = pctrls[0].cookie
+                    msgid = connection.search_ext(base_dn, ldap.SCOPE_SUBTREE, search_filter, attrlist=attrlist,
+                                                  serverctrls=[lc])
+
+                for entry in response_data:
+                    yield entry
+        finally:
             if msgid is not None:
                 connection.abandon(msgid)
-            raise
 
     def ldap_user_mp(self, user_list, group_map, sys_log=None):
         """
-        This function is the multiprocessor for getting batch users from LDAP. This is performed if you're trying to
-        query more than 1500+ users. LDAP has user query limitation.
-        :param user_list: list[dict()]
+        This function gets the information of every user. The lookups are pipelined over the connection pool, so
+        many of them are outstanding at once, and the users are returned in the order of user_list.
+        :param user_list: list[bytes] or generator of bytes
         :param group_map: list()
         :param sys_log: LOGGER
         :return: list[dict()]
         """
 
         batch_size = 225
+        return_dict = dict()
+        filters = ['memberOf', 'mail', 'givenName', 'sn']
 
-        # Setting up mp manager for return
-        manager = multiprocessing.Manager()
+        # user_list may be a generator of member DNs that are still being retrieved
+        total = len(user_list) if isinstance(user_list, list) else None
+        searches = ((user.decode('utf-8'), ldap.SCOPE_BASE, '(objectClass=*)', filters) for user in user_list)
+
+        for count, (search, user_info) in enumerate(self.search_pipelined(searches)):
+            if total and count % batch_size == 0:
+                sys_log.update_progress('Formatting Users', count / total)
+            if user_info:
+                self.create_user_json(user_info[0][1], group_map, count, return_dict)
+
+        sys_log.update_progress('Formatting Users', 1)
+
+        return list(return_dict.values())
+
+    def get_ldap_users_bulk(self, groups, group_map, sys_log=None):
+        """
+        This function gets all users of the targeted groups with paged subtree searches on memberOf, instead of one
+        query per group and one query per user. Only the attributes we need are requested.
+        :param groups: list[]
+        :param group_map: list()
+        :param sys_log: LOGGER
+        :return: list[dict()]
+        """
 
-        temp_user_list = []
         filters = ['memberOf', 'mail', 'givenName', 'sn']
+        group_dns = [self.group_dns[group] for group in groups if group in self.group_dns]
+        group_batches = list(self.chunks(group_dns, self.bulk_group_batch))
+        return_dict = dict()
+
+        for count, group_batch in enumerate(group_batches):
+            sys_log.update_progress('User Query', count / len(group_batches))
+            member_filter = ''.join('(memberOf={})'.format(ldap.filter.escape_filter_chars(group_dn))
+                                    for group_dn in group_batch)
+            search_filter = '(&(objectClass=user)(|{}))'.format(member_filter)
+
+            for user_dn, user_info in self.get_ldap_query_paged(self.base_dn, search_filter=search_filter,
+                                                                attrlist=filters):
+                # Skip search references and users that are in more than one group of the batch
+                if user_dn is None or user_dn in return_dict:
+                    continue
+                self.create_user_json(user_info, group_map, user_dn, return_dict)
 
-        test_list = list(self.chunks(user_list, batch_size))
+        sys_log.update_progress('User Query', 1)
 
-        for count, user_group in enumerate(test_list):
-            sys_log.update_progress('Formatting Users', count / len(test_list))
-            return_dict = manager.dict()
+        return list(return_dict.values())
 
-            for process_number, user in enumerate(user_group):
-                user_info_decoded = user.decode('utf-8')
-                user_info = self.conn.search_s(user_info_decoded, ldap.SCOPE_SUBTREE, attrlist=filters)[0][1]
+    def get_ldap_users_nested(self, groups, group_map, sys_log=None):
+        """
+        This function gets all users of the targeted groups including the members of nested groups. The domain
+        controller resolves the nesting with LDAP_MATCHING_RULE_IN_CHAIN, so each group costs one paged search.
+        :param groups: list[]
+        :param group_map: list()
+        :param sys_log: LOGGER
+        :return: list[dict()]
+        """
 
-                self.create_user_json(user_info, group_map, process_number, return_dict)
+        filters = ['memberOf', 'mail', 'givenName', 'sn']
+        return_dict = dict()
+
+        for count, group in enumerate(groups):
+            sys_log.update_progress('User Query', count / len(groups))
+            if group not in self.group_dns:
+                continue
+
+            # The name the group has in SIGN
+            if group_map:
+                if group not in group_map:
+                    continue
+                sign_group = group_map[group]
+            else:
+                sign_group = group
 
-            temp_user_list.append(return_dict.values())
-        temp_user_list = self.flatten_list(temp_user_list)
-        sys_log.update_progress('Formatting Users', 1)
+            search_filter = '(&(objectClass=user)(memberOf:1.2.840.113556.1.4.1941:={}))'.format(
+                ldap.filter.escape_filter_chars(self.group_dns[group]))
+
+            for user_dn, user_info in self.get_ldap_query_paged(self.base_dn, search_filter=search_filter,
+                                                                attrlist=filters):
+                if user_dn is None:
+                    continue
+                if user_dn not in return_dict:
+                    user_info.setdefault('memberOf', [])
+                    self.create_user_json(user_info, group_map, user_dn, return_dict)
+
+                # Add the group when the user is only a member through a nested group
+                return_dict[user_dn].add_group(sign_group)
 
-        return temp_user_list
+        sys_log.update_progress('User Query', 1)
+
+        return list(return_dict.values())
+
+    def lookup_users(self, user_dns, group_map):
+        """
+        This function gets the information of the given users with pipelined lookups and indexes them by DN.
+        :param user_dns: iterable of str
+        :param group_map: list()
+        :return: dict()
+        """
+
+        filters = ['memberOf', 'mail', 'givenName', 'sn']
+        searches = ((user_dn, ldap.SCOPE_BASE, '(objectClass=*)', filters) for user_dn in user_dns)
+        return_dict = dict()
+
+        for search, user_info in self.search_pipelined(searches):
+            if user_info:
+                self.create_user_json(user_info[0][1], group_map, search[0], return_dict)
+
+        return return_dict
+
+    def get_highest_usn(self):
+        """
+        This function reads the highestCommittedUSN and the name of the domain controller from its rootDSE.
+        :return: int, str
+        """
+
+        root_dse = self.conn.search_s('', ldap.SCOPE_BASE, '(objectClass=*)', ['highestCommittedUSN', 'dsServiceName'])
+        attrs = root_dse[0][1]
+
+        return int(attrs['highestCommittedUSN'][0]), attrs['dsServiceName'][0].decode('utf-8')
+
+    def get_ldap_data_incremental(self, sign_obj, sys_log=None):
+        """
+        This function returns the targeted groups and their users from the saved sync state, after reading only the
+        groups and users that changed since the previous sync. A full read is done when the state can't be used or
+        the full resync interval has passed. The state is saved by save_sync_state once the sync is done.
+        :param sign_obj: dict()
+        :param sys_log: LOGGER
+        :return: list[], list[dict()]
+        """
+
+        state = self.sync_state
+        usn, server = self.get_highest_usn()
+        changed_groups = None
+
+        if not state.needs_full_resync(usn, server, sign_obj.groups):
+            changed_groups = self.get_changed_groups(sign_obj, state.usn)
+
+        if changed_groups is None:
+            self.logs['process'].info('-- Full LDAP Sync --')
+            group_list = self.get_ldap_groups_query(sign_obj, sys_log)
+            state.members = self.get_group_members(group_list, sign_obj, sys_log)
+            state.users = self.lookup_users(state.get_member_dns(), sign_obj.groups)
+            state.full_sync = time.time()
+            state.server = server
+            state.group_map = sign_obj.groups
+            self.changed = True
+        else:
+            self.changed = self.apply_ldap_changes(sign_obj, changed_groups)
+            self.logs['process'].info('-- Incremental LDAP Sync: {} Changed Groups, Changes Found: {} --'.format(
+                len(changed_groups), self.changed))
+
+        state.usn = usn
+
+        return list(state.members), list(state.users.values())
+
+    def get_changed_groups(self, sign_obj, usn):
+        """
+        This function returns the targeted groups that changed after the given USN. Changes to the admin groups
+        change the roles of their members, which the state doesn't track, so it returns None to request a full read.
+        :param sign_obj: dict()
+        :param usn: int
+        :return: list[] or None
+        """
+
+        new_base_dn = 'OU={}, {}'.format(sign_obj.get_adobe_ou(), self.base_dn)
+        ignore_groups = ['SIGN_GROUP_ADMIN', 'SIGN_ACCOUNT_ADMIN']
+        search_filter = '(&(objectClass=group)(uSNChanged>={}))'.format(usn + 1)
+        changed_groups = list()
+
+        for group_dn, group in self.get_ldap_query_paged(new_base_dn, search_filter=search_filter,
+                                                         attrlist=['cn', 'name']):
+            if group_dn is None or 'cn' not in group:
+                continue
+            if group['name'][0].decode('utf-8') in ignore_groups:
+                return None
+            changed_groups.append(group['cn'][0].decode('utf-8'))
+
+        return changed_groups
+
+    def get_group_members(self, groups, sign_obj, sys_log=None):
+        """
+        This function returns the member DNs of each of the given groups.
+        :param groups: list[]
+        :param sign_obj: dict()
+        :param sys_log: LOGGER
+        :return: dict()
+        """
+
+        members = dict((group, []) for group in groups)
+
+        for group, member in self.iter_group_member_pairs(groups, sign_obj, sys_log):
+            members[group].append(member.decode('utf-8'))
+
+        return members
+
+    def apply_ldap_changes(self, sign_obj, changed_groups):
+        """
+        This function merges the changes made after the saved USN into the sync state. The members of changed
+        groups are read again, users that joined or left a group are looked up again or dropped, and users whose own
+        attributes changed are read with a single paged search.
+        :param sign_obj: dict()
+        :param changed_groups: list[]
+        :return: bool
+        """
+
+        state = self.sync_state
+        filters = ['memberOf', 'mail', 'givenName', 'sn']
+        affected_dns = set()
+
+        if changed_groups:
+            members = self.get_group_members(changed_groups, sign_obj)
+            for group in changed_groups:
+                affected_dns |= set(state.members.get(group, [])) ^ set(members[group])
+            state.members.update(members)
+
+        member_dns = state.get_member_dns()
+        changed_users = dict()
+        search_filter = '(&(objectClass=user)(uSNChanged>={}))'.format(state.usn + 1)
+
+        for user_dn, user_info in self.get_ldap_query_paged(self.base_dn, search_filter=search_filter,
+                                                            attrlist=filters):
+            if user_dn in member_dns:
+                self.create_user_json(user_info, sign_obj.groups, user_dn, changed_users)
+
+        affected_dns -= set(changed_users)
+
+        for user_dn in affected_dns - member_dns:
+            state.users.pop(user_dn, None)
+
+        state.users.update(changed_users)
+        state.users.update(self.lookup_users(affected_dns & member_dns, sign_obj.groups))
+
+        return bool(changed_groups or changed_users or affected_dns)
+
+    def save_sync_state(self):
+        """
+        This function saves the incremental sync state after a sync has completed.
+        """
+
+        if self.incremental_mode:
+            self.sync_state.save()
 
     @staticmethod
     def chunks(user_list, batch):
@@ -254,13 +610,12 @@ class LdapConfig:
     @staticmethod
     def create_user_json(user_info, group_map, process_number, return_dict):
         """
-        This function will format the ldap information into a json format similar to the one we get
-        from UMAPI.
+        This function will format the ldap information into a user record like the ones of the other connectors.
         :param user_info: dict()
         :param group_map: list()
         :param process_number: int
         :param return_dict: dict()
-        :return: dict()
+        :return: UserRecord
         """
 
         group_list = list()
@@ -279,14 +634,11 @@ class LdapConfig:
                     temp_group_list.append(group_map[group])
             group_list = temp_group_list
 
-        # Format it to an a standardize json format
-        data = {
-            "email": user_info['mail'][0].decode('utf-8'),
-            "firstname": user_info['givenName'][0].decode('utf-8'),
-            "groups": group_list,
-            "lastname": user_info['sn'][0].decode('utf-8'),
-            "username": user_info['mail'][0].decode('utf-8'),
-            }
+        # Format it to a standardized user record
+        data = sign_sync.user_record.UserRecord(user_info['mail'][0].decode('utf-8'),
+                                                user_info['givenName'][0].decode('utf-8'),
+                                                user_info['sn'][0].decode('utf-8'),
+                                                group_list)
 
         return_dict[process_number] = data
 
@@ -309,17 +661,6 @@ class LdapConfig:
 
         return temp_user_info
 
-    @staticmethod
-    def flatten_list(target_list):
-        """
-        This function will flatten a list of dict into a single list of dict elements
-        :param target_list: list[dict()]
-        :return: list[]
-        """
-        flatten_list = [item for sublist in target_list for item in sublist]
-
-        return flatten_list
-
     @staticmethod
     def check_group_mapping(group_list, group_map):
         """
@@ -0,0 +1,180 @@
+import email.utils
+import threading
+import time
+
+THROTTLE_STATUS_CODES = (429, 503)
+
+
+def get_retry_after(res):
+    """
+    This function reads the Retry-After header of a response. The header can either be a number of seconds or a date.
+    :param res: requests.Response
+    :return: float
+    """
+
+    return parse_retry_after(res.headers.get('Retry-After'))
+
+
+def parse_retry_after(value):
+    """
+    This function parses the value of a Retry-After header.
+    :param value: str
+    :return: float
+    """
+
+    if not value:
+        return None
+
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+
+    try:
+        return max(email.utils.mktime_tz(email.utils.parsedate_tz(value)) - time.time(), 0)
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+
+class AdaptiveLimiter:
+
+    def __init__(self, initial_limit=20, min_limit=1, max_limit=200, latency_threshold=None, max_retries=3,
+                 backoff=1.0, cooldown=None):
+        """
+        The limiter controls how many requests may be in flight at the same time (AIMD). The limit grows by one
+        for each window of healthy responses and is halved when the server throttles us, errors out or gets slower
+        than the latency threshold. After a cut the limit isn't cut again for the cooldown, which defaults to the
+        backoff.
+        :param initial_limit: int
+        :param min_limit: int
+        :param max_limit: int
+        :param latency_threshold: float
+        :param max_retries: int
+        :param backoff: float
+        :param cooldown: float
+        """
+
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(max(initial_limit, self.min_limit), self.max_limit))
+        self.latency_threshold = latency_threshold
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.cooldown = backoff if cooldown is None else cooldown
+
+        self.condition = threading.Condition()
+        self.in_flight = 0
+        self.blocked_until = 0
+        self.last_decrease = 0
+
+        self.metrics = {
+            'requests': 0,
+            'throttled': 0,
+            'errors': 0,
+            'slow': 0,
+            'retries': 0,
+            'decreases': 0,
+            'lowest_limit': int(self.limit),
+            'highest_limit': int(self.limit)
+        }
+
+    def acquire(self):
+        """
+        This function waits until a request may be sent. It blocks while a Retry-After window is open or while the
+        limit of requests in flight is reached.
+        """
+
+        with self.condition:
+            while True:
+                wait = self.blocked_until - time.time()
+                if wait > 0:
+                    self.condition.wait(wait)
+                elif self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    self.metrics['requests'] += 1
+                    return
+                else:
+                    self.condition.wait()
+
+    def try_acquire(self):
+        """
+        This function takes a slot if a request may be sent now, without blocking. Otherwise it returns how long to
+        wait before trying again, or None if the caller has to wait for a request in flight to finish.
+        :return: bool, float
+        """
+
+        with self.condition:
+            wait = self.blocked_until - time.time()
+            if wait > 0:
+                return False, wait
+            if self.in_flight < int(self.limit):
+                self.in_flight += 1
+                self.metrics['requests'] += 1
+                return True, None
+
+        return False, None
+
+    def release(self, status_code=None, latency=None, retry_after=None):
+        """
+        This function records the outcome of a request and adjusts the limit. A status code of None means the
+        request failed without a response.
+        :param status_code: int
+        :param latency: float
+        :param retry_after: float
+        """
+
+        with self.condition:
+            self.in_flight -= 1
+            now = time.time()
+
+            if status_code in THROTTLE_STATUS_CODES:
+                self.metrics['throttled'] += 1
+                self.blocked_until = max(self.blocked_until, now + (retry_after or self.backoff))
+                self.decrease(now)
+            elif status_code is None or status_code >= 500:
+                self.metrics['errors'] += 1
+                self.decrease(now)
+            elif self.latency_threshold and latency is not None and latency > self.latency_threshold:
+                self.metrics['slow'] += 1
+                self.decrease(now)
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+                self.metrics['highest_limit'] = max(self.metrics['highest_limit'], int(self.limit))
+
+            self.condition.notify_all()
+
+    def decrease(self, now):
+        """
+        This function halves the limit. Responses within the cooldown after the last cut, which belong to requests
+        that were already in flight when the limit was cut, don't cut it again.
+        :param now: float
+        """
+
+        if now - self.last_decrease < self.cooldown:
+            return
+
+        self.last_decrease = now
+        self.limit = max(self.min_limit, self.limit / 2)
+        self.metrics['decreases'] += 1
+        self.metrics['lowest_limit'] = min(self.metrics['lowest_limit'], int(self.limit))
+
+    def record_retry(self):
+        """
+        This function counts a request that is sent again after being throttled.
+        """
+
+        with self.condition:
+            self.metrics['retries'] += 1
+
+    def get_metrics(self):
+        """
+        This function returns the current limit together with the throttle counters.
+        :return: dict()
+        """
+
+        with self.condition:
+            metrics = dict(self.metrics)
+            metrics['limit'] = int(self.limit)
+            metrics['in_flight'] = self.in_flight
+
+        return metrics
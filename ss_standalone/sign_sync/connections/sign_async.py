@@ -0,0 +1,327 @@
+import asyncio
+import json
+import time
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+import sign_sync.connections.rate_limiter
+
+STOP = object()
+
+
+class AsyncResponse:
+
+    def __init__(self, status_code, text, reason, headers=None):
+        """
+        This class holds the parts of a response the sync needs once the connection has been released.
+        :param status_code: int
+        :param text: str
+        :param reason: str
+        :param headers: dict()
+        """
+
+        self.status_code = status_code
+        self.text = text
+        self.reason = reason
+        self.headers = headers or {}
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class AsyncSign:
+
+    def __init__(self, sign_obj):
+        """
+        The async engine runs the Sign phases on an asyncio event loop instead of worker threads. All decisions are
+        taken by the Sign object, so both modes produce the same result.
+        :param sign_obj: Sign
+        """
+
+        self.sign = sign_obj
+        self.logs = sign_obj.logs
+        self.url = sign_obj.url
+        self.email = sign_obj.email
+        self.concurrency = sign_obj.async_concurrency
+        self.phase_sizes = sign_obj.phase_workers
+        self.limiter = sign_obj.limiter
+        self.timeout = sign_obj.transport.timeout
+        self.loop = asyncio.new_event_loop()
+        self.session = None
+        self.released = None
+
+    @staticmethod
+    def is_available():
+        """
+        This function checks if aiohttp is installed.
+        :return: bool
+        """
+
+        return aiohttp is not None
+
+    def get_concurrency(self, phase=None):
+        """
+        This function returns how many tasks of a phase may run at the same time. The phase caps of the worker
+        settings apply to the async mode as well.
+        :param phase: str
+        :return: int
+        """
+
+        concurrency = self.phase_sizes.get(phase) or self.concurrency
+
+        return max(1, min(concurrency, self.concurrency))
+
+    def map(self, func, items, phase=None):
+        """
+        This function runs the coroutine func for every item with at most the concurrency of the phase in flight.
+        It has the same interface as WorkerPool.map.
+        :param func: async def()
+        :param items: list[]
+        :param phase: str
+        :return: list[], list[(item, error)]
+        """
+
+        return self.loop.run_until_complete(self.gather(func, items, self.get_concurrency(phase)))
+
+    async def gather(self, func, items, concurrency):
+        """
+        This function schedules func for every item. Items are pulled from the iterator in a thread, so a paged
+        listing doesn't block the requests that are already in flight.
+        :param func: async def()
+        :param items: list[]
+        :param concurrency: int
+        :return: list[], list[(item, error)]
+        """
+
+        if self.session is None:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.concurrency),
+                timeout=aiohttp.ClientTimeout(total=self.timeout))
+            self.released = asyncio.Event()
+
+        semaphore = asyncio.Semaphore(concurrency)
+        iterator = iter(items)
+        tasks = []
+
+        async def run(item):
+            try:
+                return await func(item)
+            finally:
+                semaphore.release()
+
+        while True:
+            item = await self.loop.run_in_executor(None, next, iterator, STOP)
+            if item is STOP:
+                break
+            await semaphore.acquire()
+            tasks.append((item, self.loop.create_task(run(item))))
+
+        results = []
+        errors = []
+        for item, task in tasks:
+            try:
+                results.append(await task)
+            except Exception as error:
+                errors.append((item, error))
+
+        return results, errors
+
+    def shutdown(self):
+        """
+        This function closes the HTTP session and the event loop. It has the same interface as WorkerPool.shutdown.
+        """
+
+        if self.session is not None:
+            self.loop.run_until_complete(self.session.close())
+            self.session = None
+
+        self.loop.close()
+
+    async def acquire(self):
+        """
+        This function waits until the shared limiter lets a request through, without blocking the event loop. It
+        wakes up when a request of this engine finishes, or after a short time for requests of other threads.
+        """
+
+        while True:
+            self.released.clear()
+            acquired, wait = self.limiter.try_acquire()
+            if acquired:
+                return
+
+            try:
+                await asyncio.wait_for(self.released.wait(), wait or 0.05)
+            except asyncio.TimeoutError:
+                pass
+
+    async def request(self, method, path, headers, payload=None):
+        """
+        This function sends a request to SIGN through the shared limiter, so the async mode backs off the same way
+        as the threads. Throttled requests are sent again once the Retry-After window of the limiter passed.
+        :param method: str
+        :param path: str
+        :param headers: dict()
+        :param payload: dict()
+        :return: AsyncResponse
+        """
+
+        data = None if payload is None else json.dumps(payload)
+        attempt = 0
+
+        while True:
+            await self.acquire()
+            start = time.time()
+
+            try:
+                async with self.session.request(method, self.url + path, headers=headers, data=data) as res:
+                    response = AsyncResponse(res.status, await res.text(), res.reason, res.headers.copy())
+            except BaseException as error:
+                # Give the slot back even if the request was cancelled
+                self.limiter.release()
+                self.released.set()
+                if isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError)):
+                    self.logs['error'].error("-- ERROR: {} --".format(error))
+                raise
+
+            self.limiter.release(response.status_code, time.time() - start,
+                                 sign_sync.connections.rate_limiter.get_retry_after(response))
+            self.released.set()
+
+            if response.status_code not in sign_sync.connections.rate_limiter.THROTTLE_STATUS_CODES \
+                    or attempt >= self.limiter.max_retries:
+                return response
+
+            attempt += 1
+            self.limiter.record_retry()
+
+    async def api_post_group_request(self, data):
+        return await self.request('POST', 'groups', self.sign.temp_header, data)
+
+    async def api_get_user_by_id_request(self, user_id, etag=None):
+        headers = self.sign.header
+        if etag is not None:
+            headers = dict(self.sign.header)
+            headers['If-None-Match'] = etag
+
+        return await self.request('GET', 'users/' + user_id, headers)
+
+    async def api_put_user_request(self, sign_user_id, data):
+        return await self.request('PUT', 'users/' + sign_user_id, self.sign.temp_header, data)
+
+    async def api_put_user_status_request(self, user_id, payload):
+        return await self.request('PUT', 'users/' + user_id + '/status', self.sign.header, payload)
+
+    async def create_sign_group(self, group_name):
+        """
+        This function will create a group in Adobe SIGN if the group doesn't already exist.
+        :param group_name: str
+        :return: str
+        """
+
+        if group_name in self.sign.group_directory:
+            return None
+
+        res = await self.api_post_group_request({"groupName": group_name})
+
+        return self.sign.record_created_group(group_name, res)
+
+    async def get_active_user_list(self, user):
+        """
+        This function will check if a user in Adobe Sign is active.
+        :param user: dict[]
+        :return: dict()
+        """
+
+        if user['email'].lower() != self.email.lower():
+            user_data, etag = self.sign.lookup_user_status(user['userId'], user['email'], user.get('userStatus'))
+
+            if user_data is None:
+                res = await self.api_get_user_by_id_request(user['userId'], etag)
+                user_data = self.sign.record_user_status(user['userId'], user['email'], res)
+
+            if user_data['userStatus'] == 'ACTIVE':
+                return user_data
+
+        return None
+
+    async def reactivate_user(self, user):
+        """
+        This function will reactivate a user that is about to be synced if the account is inactive.
+        :param user: UserRecord
+        """
+
+        if self.sign.get_group_payload(user) is None:
+            return
+
+        user_data, etag = self.sign.lookup_user_status(user.user_id, user.email)
+
+        if user_data is None:
+            res = await self.api_get_user_by_id_request(user.user_id, etag)
+            if res.status_code not in (200, 304):
+                self.logs['error'].error('!! Reading Status Error !! {}'.format(user.email))
+                self.logs['error'].error('!! Reason !! {}'.format(res.reason))
+                return
+            user_data = self.sign.record_user_status(user.user_id, user.email, res)
+
+        if user_data['userStatus'] == "INACTIVE":
+            await self.reactivate_account(user.user_id, user.email)
+
+    async def reactivate_account(self, user_id, email):
+        """
+        This function will reactivate a user account that's been inactive
+        :param user_id: str
+        :param email: str
+        """
+
+        res = await self.api_put_user_status_request(user_id, {"userStatus": "ACTIVE"})
+        if res.status_code == 200:
+            self.sign.record_status_change(user_id, 'ACTIVE')
+            self.logs['process'].info('-- Account: Reactivation -- {}'.format(email))
+        else:
+            self.logs['error'].error('!! Reactivation Error !! {}'.format(email))
+            self.logs['error'].error('!! Reason !! {}'.format(res.reason))
+
+    async def process_user(self, user):
+        """
+        This function will process each user and assign them to their Sign groups
+        :param user: UserRecord
+        """
+
+        temp_payload, changes = self.sign.get_user_update(user)
+
+        if temp_payload is not None:
+            res = await self.api_put_user_request(user.user_id, temp_payload)
+            self.sign.record_user_update(user, temp_payload, changes, res)
+
+    async def remove_user_privileges(self, user_info):
+        """
+        This function will remove all user privileges in order to be able to deactivate the user.
+        :param user_info: dict()
+        """
+
+        data = self.sign.get_default_payload(user_info)
+        res = await self.api_put_user_request(user_info['userId'], data)
+        if res.status_code == 200:
+            self.sign.status_cache.set_state(user_info['userId'], data)
+            self.logs['process'].info('-- Privileges Removed -- {}'.format(user_info['email']))
+        else:
+            self.logs['error'].error('!! Privileges Removed Failed !! {}'.format(user_info['email']))
+            self.logs['error'].error('!! Reason !! {}'.format(res.reason))
+
+    async def deactivate_users(self, user):
+        """
+        This function will deactivate a user.
+        :param user: dict()
+        """
+
+        await self.remove_user_privileges(user)
+        res = await self.api_put_user_status_request(user['userId'], {"userStatus": 'INACTIVE'})
+        if res.status_code == 200:
+            self.sign.record_status_change(user['userId'], 'INACTIVE')
+            self.logs['process'].info('-- Account Deactivated -- {}'.format(user['email']))
+        else:
+            self.logs['error'].error('!! Deactivation Error !! {}'.format(user['email']))
+            self.logs['error'].error('!! Reason !! {}'.format(res.reason))
@@ -1,7 +1,13 @@
 import requests
 import json
+import threading
 import yaml
 
+import sign_sync.connections.http_transport
+import sign_sync.connections.rate_limiter
+import sign_sync.snapshot
+import sign_sync.sync_cache
+
 LOGGER = None
 
 
@@ -32,6 +38,35 @@ class Sign:
         self.connector = self.sign_config_yml['sign_sync']['connector']
         self.account_type = self.sign_config_yml['umapi_conditions']['target_account_type']
         self.cache_mode = self.sign_config_yml['sign_sync']['cache_mode']
+        self.page_size = self.sign_config_yml['sign_sync'].get('page_size')
+        self.status_cache = sign_sync.sync_cache.StatusCache(self.sign_config_yml['sign_sync'].get('status_cache_ttl'))
+        self.write_lock = threading.Lock()
+        self.write_counts = {'written': 0, 'skipped': 0}
+        if self.cache_mode:
+            self.status_cache.load()
+
+        # Read worker parameters
+        worker_config = self.sign_config_yml['sign_sync'].get('workers') or {}
+        self.worker_count = worker_config.get('size') or 200
+        self.phase_workers = worker_config.get('phases') or {}
+        self.execution_mode = self.sign_config_yml['sign_sync'].get('execution_mode') or 'threads'
+        self.async_concurrency = worker_config.get('async_concurrency') or 1000
+
+        # Read connection pool parameters
+        http_config = self.sign_config_yml['sign_sync'].get('http') or {}
+        self.transport = sign_sync.connections.http_transport.HttpTransport(
+            pool_size=http_config.get('pool_size') or self.worker_count, timeout=http_config.get('timeout') or 60)
+
+        # Read adaptive concurrency parameters
+        limiter_config = self.sign_config_yml['sign_sync'].get('limiter') or {}
+        self.limiter = sign_sync.connections.rate_limiter.AdaptiveLimiter(
+            initial_limit=limiter_config.get('initial_limit') or 20,
+            min_limit=limiter_config.get('min_limit') or 1,
+            max_limit=limiter_config.get('max_limit') or self.worker_count,
+            latency_threshold=limiter_config.get('latency_threshold'),
+            max_retries=limiter_config.get('max_retries') or 3,
+            cooldown=limiter_config.get('cooldown'))
+        self.transport.add_limiter(self.host, self.limiter)
 
         # Read enterprise parameters
         self.integration = self.sign_config_yml['enterprise']['integration']
@@ -51,8 +86,9 @@ class Sign:
         self.header = self.get_sign_header()
         self.temp_header = self.get_temp_header()
 
-        self.sign_users = self.get_sign_users()
-        self.default_group = self.get_sign_group()['Default Group']
+        self.snapshot = sign_sync.snapshot.SignSnapshot(self.iter_sign_users, self.get_sign_group)
+        self.group_directory = self.snapshot.groups
+        self.default_group = self.group_directory.get('Default Group')
 
         # Group Mapping
         self.groups = self.sign_config_yml['sign_sync']['group_mapping']
@@ -90,9 +126,9 @@ class Sign:
         """
 
         if self.version == "v5":
-            res = requests.get(url + "base_uris", headers=self.header)
+            res = self.transport.get(url + "base_uris", headers=self.header)
         else:
-            res = requests.get(url + "baseUris", headers=headers)
+            res = self.transport.get(url + "baseUris", headers=headers)
 
         return res
 
@@ -103,18 +139,26 @@ class Sign:
         :return: dict()
         """
 
-        res = requests.get(self.url + 'groups', headers=self.header)
+        res = self.transport.get(self.url + 'groups', headers=self.header)
 
         return res
 
     @SignDecorators.exception_catcher
-    def api_get_users_request(self):
+    def api_get_users_request(self, cursor=None, page_size=None):
         """
-        API request to get user information from SIGN.
+        API request to get a page of user information from SIGN.
+        :param cursor: str
+        :param page_size: int
         :return: dict()
         """
 
-        res = requests.get(self.url + 'users', headers=self.header)
+        params = {}
+        if cursor is not None:
+            params['cursor'] = cursor
+        if page_size is not None:
+            params['pageSize'] = page_size
+
+        res = self.transport.get(self.url + 'users', headers=self.header, params=params)
 
         return res
 
@@ -126,7 +170,7 @@ class Sign:
         :return: dict[]
         """
 
-        res = requests.post(self.url + 'groups', headers=self.temp_header, data=json.dumps(data))
+        res = self.transport.post(self.url + 'groups', headers=self.temp_header, data=json.dumps(data))
 
         return res
 
@@ -139,19 +183,25 @@ class Sign:
         :return: dict()
         """
 
-        res = requests.put(self.url + 'users/' + sign_user_id, headers=self.temp_header, data=json.dumps(data))
+        res = self.transport.put(self.url + 'users/' + sign_user_id, headers=self.temp_header, data=json.dumps(data))
 
         return res
 
     @SignDecorators.exception_catcher
-    def api_get_user_by_id_request(self, user_id):
+    def api_get_user_by_id_request(self, user_id, etag=None):
         """
-        API request to get user by ID
+        API request to get user by ID. If an ETag is given the request is conditional.
         :param user_id:  str
+        :param etag: str
         :return: dict()
         """
 
-        res = requests.get(self.url + 'users/' + user_id, headers=self.header)
+        headers = self.header
+        if etag is not None:
+            headers = dict(self.header)
+            headers['If-None-Match'] = etag
+
+        res = self.transport.get(self.url + 'users/' + user_id, headers=headers)
 
         return res
 
@@ -164,7 +214,7 @@ class Sign:
         :return: dict()
         """
 
-        res = requests.put(self.url + 'users/' + user_id + '/status',
+        res = self.transport.put(self.url + 'users/' + user_id + '/status',
                            headers=self.header, data=json.dumps(payload))
 
         return res
@@ -177,7 +227,7 @@ class Sign:
         :return: dict()
         """
 
-        res = requests.post(self.url + 'users',
+        res = self.transport.post(self.url + 'users',
                             headers=self.header, data=json.dumps(payload))
 
         return res
@@ -247,54 +297,112 @@ class Sign:
 
         return self.product_profile
 
-    def get_sign_users(self):
+    def iter_sign_users(self, page_size=None):
         """
-        This function will create a list of all users in SIGN.
-        :return: list[dict()]
+        This function will yield the users in SIGN page by page, following the paging cursor until the last page.
+        A page that fails raises an HTTPError, so a partial listing can never look like the complete account.
+        :param page_size: int
+        :return: generator of dict()
         """
 
-        user_list = []
-        res = self.api_get_users_request()
+        if page_size is None:
+            page_size = self.page_size
 
-        if res.status_code == 200:
-            user_list.append(res.json()['userInfoList'])
+        cursor = None
+
+        while True:
+            res = self.api_get_users_request(cursor, page_size)
 
-        return user_list[0]
+            if res.status_code != 200:
+                self.logs['error'].error('!! Listing Users Error !! {}'.format(res.text))
+                self.logs['error'].error('!! Reason !! {}'.format(res.reason))
+                raise requests.exceptions.HTTPError('Listing users failed with status {}'.format(res.status_code),
+                                                    response=res)
 
-    def create_sign_group(self, group_list, sys_log):
+            data = res.json()
+            for user in data.get('userInfoList', []):
+                yield user
+
+            cursor = data.get('page', {}).get('nextCursor')
+            if not cursor:
+                return
+
+    def create_sign_group(self, group_name):
         """
-        This function will create a group in Adobe SIGN if the group doesn't already exist.
-        :param group_list: list[]
-        :param sys_log: LOGGER
-        :return:
+        This function will create a group in Adobe SIGN if the group doesn't already exist. A group that SIGN
+        reports as already existing counts as a success, its name is returned so the groupId can be resolved.
+        :param group_name: str
+        :return: str
         """
 
-        sign_group = self.get_sign_group()
+        if group_name in self.group_directory:
+            return None
 
-        for count, group_name in enumerate(group_list):
-            sys_log.update_progress('Creating Groups', count / len(group_list))
-            data = {
-                "groupName": group_name
-            }
+        data = {
+            "groupName": group_name
+        }
 
-            # SIGN API to get existing groups
-            res = self.api_post_group_request(data)
+        # SIGN API to create the group
+        res = self.api_post_group_request(data)
 
-            if res.status_code == 201:
-                self.logs['process'].info('{} Group Created...'.format(group_name))
-                res_data = res.json()
-                sign_group[group_name] = res_data['groupId']
-            else:
-                self.logs['error'].error("!! {}: Creating group error !! {}".format(group_name, res.text))
-                self.logs['error'].error('!! Reason !! {}'.format(res.reason))
+        return self.record_created_group(group_name, res)
+
+    def record_created_group(self, group_name, res):
+        """
+        This function adds a created group to the group directory.
+        :param group_name: str
+        :param res: Response
+        :return: str
+        """
 
-        sys_log.update_progress('Creating Groups', 1)
+        if res.status_code == 201:
+            self.logs['process'].info('{} Group Created...'.format(group_name))
+            res_data = res.json()
+            self.group_directory.add(group_name, res_data['groupId'])
+        elif self.is_existing_group_error(res):
+            self.logs['process'].info('{} Group Already Exists...'.format(group_name))
+            return group_name
+        else:
+            self.logs['error'].error("!! {}: Creating group error !! {}".format(group_name, res.text))
+            self.logs['error'].error('!! Reason !! {}'.format(res.reason))
+
+        return None
+
+    @staticmethod
+    def is_existing_group_error(res):
+        """
+        This function checks if a failed group creation failed because the group already exists.
+        :param res: Response
+        :return: bool
+        """
+
+        if res.status_code == 409:
+            return True
+
+        try:
+            code = res.json().get('code')
+        except (ValueError, AttributeError):
+            return False
+
+        return code is not None and 'ALREADY_EXISTS' in code
+
+    def resolve_existing_groups(self, group_list):
+        """
+        This function looks up the groupId of groups that already existed by fetching the group directory again.
+        :param group_list: list[]
+        """
+
+        groups = self.group_directory.refresh()
+
+        for group_name in group_list:
+            if group_name not in groups:
+                self.logs['error'].error('!! {}: Existing group not found !!'.format(group_name))
 
     def create_user_account(self, user):
         """
         This function will route the application to either provisioning a user with email verification, email
         suppression or auto provisioning turned off.
-        :param user: dict[]
+        :param user: UserRecord
         :return:
         """
 
@@ -303,69 +411,71 @@ class Sign:
         elif self.auto_provision and not self.auto_password:
             self.auto_provision_email_verification(user)
         else:
-            self.logs['process'].info('-- Auto provisioning turned off -- {} '.format(user['email']))
+            self.logs['process'].info('-- Auto provisioning turned off -- {} '.format(user.email))
 
     def auto_provision_email_verification(self, user):
         """
         This function will provision a user, but the user account will need to be manually activated in order to user
         Adobe Sign. User will be moved to corresponding groups regardless if they've been activated.
-        :param user: dict()
+        :param user: UserRecord
         :return:
         """
 
         payload = {
-            "email": user['email'],
-            "firstName": user['firstname'],
-            "lastName": user['lastname']
+            "email": user.email,
+            "firstName": user.firstname,
+            "lastName": user.lastname
         }
 
         res = self.api_post_user_request(payload)
 
         if res.status_code == 200:
-            self.logs['process'].info('-- Account Email Activation Required -- {}'.format(user['email']))
+            self.record_created_user(user, res)
+            self.logs['process'].info('-- Account Email Activation Required -- {}'.format(user.email))
         else:
-            self.logs['error'].error("!! Account Creation Error !! {}".format(user['email']))
+            self.logs['error'].error("!! Account Creation Error !! {}".format(user.email))
             self.logs['error'].error('!! Reason !! {}'.format(res.reason))
 
     def auto_provision_email_suppression(self, user):
         """
         This function will provision users with email activation suppression. However, a tech ops and support ticket
         will need to be created to edit backend settings. Please view user documentation for this information.
-        :param user: dict[]
+        :param user: UserRecord
         :return: None
         """
 
-        company = None
-        phone = None
-        title = None
-
-        if "company" in user:
-            company = user['company']
-
-        if "mobile" in user:
-            phone = user['mobile']
-
-        if 'title' in user:
-            title = user['title']
-
+        # None of the connectors provide the company, phone or title of a user
         payload = {
-            "email": user['email'],
-            "firstName": user['firstname'],
-            "lastName": user['lastname'],
-            "company": company,
+            "email": user.email,
+            "firstName": user.firstname,
+            "lastName": user.lastname,
+            "company": None,
             "password": self.auto_password,
-            "phone": phone,
-            "title": title
+            "phone": None,
+            "title": None
         }
 
         res = self.api_post_user_request(payload)
 
         if res.status_code == 200:
-            self.logs['process'].info('-- Account Created/Activated -- {}'.format(user['email']))
+            self.record_created_user(user, res)
+            self.logs['process'].info('-- Account Created/Activated -- {}'.format(user.email))
         else:
-            self.logs['error'].error("!! Account Creation Error !! {}".format(user['email']))
+            self.logs['error'].error("!! Account Creation Error !! {}".format(user.email))
             self.logs['error'].error('!! Reason !! {}'.format(res.reason))
 
+    def record_created_user(self, user, res):
+        """
+        This function adds a user that was just provisioned to the snapshot.
+        :param user: UserRecord
+        :param res: Response
+        """
+
+        user_id = res.json().get('userId')
+
+        if user_id is not None:
+            self.snapshot.add_user({'userId': user_id, 'email': user.email})
+
     def get_temp_header(self):
         """
         This function creates a temp header to push json payloads
@@ -381,7 +491,7 @@ class Sign:
     def get_user_info(self, user_info, group_id, group=None):
         """
         Retrieve user's information
-        :param user_info: dict()
+        :param user_info: UserRecord
         :param group_id: str
         :param group: list[]
         :return: dict()
@@ -393,44 +503,136 @@ class Sign:
             privileges = self.check_ldap_privileges(user_info)
 
         data = {
-            "email": user_info['username'],
-            "firstName": user_info['firstname'],
+            "email": user_info.username,
+            "firstName": user_info.firstname,
             "groupId": group_id,
-            "lastName": user_info['lastname'],
+            "lastName": user_info.lastname,
             "roles": privileges
         }
 
         return data
 
-    def get_user_status(self, user):
+    def lookup_user_status(self, user_id, email, listed_status=None):
         """
-        This function will get a list of all active users in Adobe Sign
-        :return: list[]
+        This function looks up the status of a user without asking SIGN. The listing is used when it carries the
+        status, else the status cache when its entry is fresh. If neither is enough, the ETag of the cached entry
+        is returned so the status can be fetched with a conditional request.
+        :param user_id: str
+        :param email: str
+        :param listed_status: str
+        :return: dict(), str
+        """
+
+        if listed_status is not None and listed_status != 'ACTIVE':
+            self.status_cache.count('listing')
+            return {'userStatus': listed_status}, None
+
+        entry = self.status_cache.get(user_id)
+        if entry is None:
+            return None, None
+
+        if self.status_cache.is_fresh(entry):
+            self.status_cache.count('cached')
+            return self.get_cached_user_data(user_id, email, entry), None
+
+        return None, entry['etag']
+
+    def record_user_status(self, user_id, email, res):
+        """
+        This function stores the status SIGN returned for a user. A 304 response means the cached entry is still
+        correct.
+        :param user_id: str
+        :param email: str
+        :param res: Response
+        :return: dict()
         """
-        res = requests.get(self.url + 'users/' + user['userId'], headers=self.header)
+
+        entry = self.status_cache.get(user_id)
+
+        if res.status_code == 304 and entry is not None:
+            self.status_cache.touch(user_id)
+            self.status_cache.count('not_modified')
+            return self.get_cached_user_data(user_id, email, entry)
+
         user_data = res.json()
+        user_data['userId'] = user_id
+        self.status_cache.update(user_id, user_data, res.headers.get('ETag'))
+        self.status_cache.count('fetched')
 
-        if user_data['userStatus'] == 'ACTIVE':
-            user_data['userId'] = user['userId']
-            return user_data
+        return user_data
 
-        return None
+    @staticmethod
+    def get_cached_user_data(user_id, email, entry):
+        """
+        This function rebuilds the user information from a status cache entry.
+        :param user_id: str
+        :param email: str
+        :param entry: dict()
+        :return: dict()
+        """
+
+        return {
+            'userId': user_id,
+            'email': entry['email'] or email,
+            'firstName': entry['firstName'],
+            'lastName': entry['lastName'],
+            'userStatus': entry['userStatus']
+        }
 
-    def get_active_user_list(self, user, queue):
+    def get_active_user_list(self, user):
         """
-        This function will grab a list of active users in Adobe Sign.
+        This function will check if a user in Adobe Sign is active.
         :param user: dict[]
-        :param queue: Queue
-        :return:
+        :return: dict()
         """
 
         if user['email'].lower() != self.email.lower():
-            res = self.api_get_user_by_id_request(user['userId'])
-            user_data = res.json()
+            user_data, etag = self.lookup_user_status(user['userId'], user['email'], user.get('userStatus'))
+
+            if user_data is None:
+                res = self.api_get_user_by_id_request(user['userId'], etag)
+                user_data = self.record_user_status(user['userId'], user['email'], res)
 
             if user_data['userStatus'] == 'ACTIVE':
-                user_data['userId'] = user['userId']
-                queue.put(user_data)
+                return user_data
+
+        return None
+
+    def reactivate_user(self, user):
+        """
+        This function will reactivate a user that is about to be synced if the account is inactive. The status is
+        only fetched from SIGN when it's unknown or stale.
+        :param user: UserRecord
+        :return:
+        """
+
+        # Users without a SIGN group aren't synced, so they don't need to be reactivated
+        if self.get_group_payload(user) is None:
+            return
+
+        user_data, etag = self.lookup_user_status(user.user_id, user.email)
+
+        if user_data is None:
+            # SIGN API call to get user by ID
+            res = self.api_get_user_by_id_request(user.user_id, etag)
+            if res.status_code not in (200, 304):
+                self.logs['error'].error('!! Reading Status Error !! {}'.format(user.email))
+                self.logs['error'].error('!! Reason !! {}'.format(res.reason))
+                return
+            user_data = self.record_user_status(user.user_id, user.email, res)
+
+        if user_data['userStatus'] == "INACTIVE":
+            self.reactivate_account(user.user_id, user.email)
+
+    def record_status_change(self, user_id, status):
+        """
+        This function records a status the sync set for a user in the snapshot and the status cache.
+        :param user_id: str
+        :param status: str
+        """
+
+        self.snapshot.update_user(user_id, {'userStatus': status})
+        self.status_cache.set_status(user_id, status)
 
     def reactivate_account(self, user_id, email):
         """
@@ -440,24 +642,16 @@ class Sign:
         :return:
         """
 
-        data = {}
+        payload = {"userStatus": "ACTIVE"}
 
-        # SIGN API call to get user by ID
-        res = self.api_get_user_by_id_request(user_id)
+        # SIGN API call to reactivate user account
+        res = self.api_put_user_status_request(user_id, payload)
         if res.status_code == 200:
-            data = res.json()
-
-        if data['userStatus'] == "INACTIVE":
-            payload = {"userStatus": "ACTIVE"}
-
-            # SIGN API call to reactivate user account
-            res = self.api_put_user_status_request(user_id, payload)
-            if res.status_code == 200:
-                self.logs['process'].info('-- Account: Reactivation -- {}'.format(email))
-                self.logs['process'].info('-- Account: Reactivation -- {}'.format(email))
-            else:
-                self.logs['error'].error('!! Reactivation Error !! {}'.format(email))
-                self.logs['error'].error('!! Reason !! {}'.format(res.reason))
+            self.record_status_change(user_id, 'ACTIVE')
+            self.logs['process'].info('-- Account: Reactivation -- {}'.format(email))
+        else:
+            self.logs['error'].error('!! Reactivation Error !! {}'.format(email))
+            self.logs['error'].error('!! Reason !! {}'.format(res.reason))
 
     def deactivate_users(self, user):
         """
@@ -471,6 +665,7 @@ class Sign:
         self.remove_user_privileges(user)
         res = self.api_put_user_status_request(user['userId'], data)
         if res.status_code == 200:
+            self.record_status_change(user['userId'], 'INACTIVE')
             self.logs['process'].info('-- Account Deactivated -- {}'.format(user['email']))
         else:
             self.logs['error'].error('!! Deactivation Error !! {}'.format(user['email']))
@@ -483,27 +678,37 @@ class Sign:
         :return:
         """
 
-        data = {
-            "email": user_info['email'],
-            "firstName": user_info['firstName'],
-            "groupId": self.default_group,
-            "lastName": user_info['lastName'],
-            "roles": ['NORMAL_USER']
-        }
+        data = self.get_default_payload(user_info)
 
         res = self.api_put_user_request(user_info['userId'], data)
         if res.status_code == 200:
+            self.status_cache.set_state(user_info['userId'], data)
             self.logs['process'].info('-- Privileges Removed -- {}'.format(user_info['email']))
         else:
             self.logs['error'].error('!! Privileges Removed Failed !! {}'.format(user_info['email']))
             self.logs['error'].error('!! Reason !! {}'.format(res.reason))
 
+    def get_default_payload(self, user_info):
+        """
+        This function returns the payload that moves a user back to the default group without any privileges.
+        :param user_info: dict()
+        :return: dict()
+        """
+
+        return {
+            "email": user_info['email'],
+            "firstName": user_info['firstName'],
+            "groupId": self.default_group,
+            "lastName": user_info['lastName'],
+            "roles": ['NORMAL_USER']
+        }
+
     @staticmethod
     def check_umapi_privileges(group, umapi_user_info):
         """
         This function will look through the configuration settings and give access privileges access to each user.
         :param group: list[]
-        :param umapi_user_info: dict()
+        :param umapi_user_info: UserRecord
         :return:
         """
 
@@ -512,11 +717,11 @@ class Sign:
         acc_admin_flag = False
         group_admin_flag = False
 
-        for user_group in umapi_user_info['groups']:
+        for user_group in umapi_user_info.groups:
 
             # Check to see if groups are part of an admin groups
             if len(user_group) >= 7 and '_admin_' in user_group[:7]:
-                if user_group[7:] in umapi_user_info['productprofile']:
+                if user_group[7:] in umapi_user_info.productprofile:
                     acc_admin_flag = True
                 if user_group[7:] == group:
                     group_admin_flag = True
@@ -537,12 +742,12 @@ class Sign:
     def check_ldap_privileges(user_info):
         """
         This function will look through each user's membership profile to determine what admin rights they will have.
-        :param user_info: dict()
+        :param user_info: UserRecord
         :return: list[]
         """
 
         # Filter out the user groups leaving just the admin right groups.
-        group_list = user_info['groups']
+        group_list = user_info.groups
         admin_rights = ['SIGN_GROUP_ADMIN', 'SIGN_ACCOUNT_ADMIN']
         admin_group_list = [group for group in group_list if any(word in group for word in admin_rights)]
 
@@ -558,53 +763,115 @@ class Sign:
 
         return privileges
 
-    def check_user_existence(self, user_list):
+    def check_user_existence(self, reconciler):
         """
-        This function checks to see if the user exist in SIGN.
-        :param user_list: list[dict()]
-        :return: list[dict()]
+        This function checks to see if the user exist in SIGN. Users that don't exist yet will be provisioned.
+        :param reconciler: Reconciler
+        :return: list[UserRecord]
         """
 
-        sign_users = self.get_sign_users()
-        updated_user_list = []
+        reconciliation = reconciler.reconcile(self.snapshot.iter_users())
 
-        for user in user_list:
-            # If user email exist in SIGN we will skip the user
-            if any(target_user['email'].lower() == user['email'].lower() for target_user in sign_users):
-                pass
-            else:
-                self.create_user_account(user)
+        for user in reconciliation['add']:
+            self.create_user_account(user)
 
-            for sign_user in sign_users:
-                if user['email'].lower() in sign_user['email'].lower():
-                    user['userId'] = sign_user['userId']
-                    updated_user_list.append(user)
-                else:
-                    pass
+        return reconciliation['update']
 
-        return updated_user_list
+    def get_group_payload(self, user):
+        """
+        This function returns the payload that assigns the user to the first of their groups in SIGN.
+        Sign doesn't support multi group assignment at this time.
+        :param user: UserRecord
+        :return: dict()
+        """
+
+        for group in sorted(user.groups):
+            group_id = self.group_directory.get(group)
+            if group_id is not None:
+                return self.get_user_info(user, group_id, group)
+            break
+
+        return None
+
+    @staticmethod
+    def get_payload_changes(payload, current):
+        """
+        This function compares the payload the sync wants to write with the current state of the user in SIGN and
+        returns the fields that differ. Every field differs if the current state is unknown.
+        :param payload: dict()
+        :param current: dict()
+        :return: list[]
+        """
+
+        if current is None:
+            current = {}
+
+        changes = [field for field in ('groupId', 'firstName', 'lastName') if payload[field] != current.get(field)]
+
+        if sorted(payload['roles']) != sorted(current.get('roles') or []):
+            changes.append('roles')
+
+        return changes
+
+    def get_user_update(self, user):
+        """
+        This function returns the payload to write for a user and the fields that trigger the write. The payload is
+        None if the user has no SIGN group or is already up to date.
+        :param user: UserRecord
+        :return: dict(), list[]
+        """
+
+        payload = self.get_group_payload(user)
+
+        if payload is None:
+            return None, []
+
+        changes = self.get_payload_changes(payload, self.status_cache.get(user.user_id))
+
+        if not changes:
+            self.count_write('skipped')
+            return None, []
+
+        return payload, changes
+
+    def record_user_update(self, user, payload, changes, res):
+        """
+        This function logs the outcome of a user update and records the new state of the user.
+        :param user: UserRecord
+        :param payload: dict()
+        :param changes: list[]
+        :param res: Response
+        """
+
+        if res.status_code == 200:
+            self.count_write('written')
+            self.status_cache.set_state(user.user_id, payload)
+            self.logs['process'].info('<< Information Updated >> {} ({})'.format(user.email, ', '.join(changes)))
+
+        else:
+            self.logs['error'].error("!! Adding User To Group Error !! {} \n{}".format(user.email, res.text))
+            self.logs['error'].error('!! Reason !! {}'.format(res.reason))
+
+    def count_write(self, outcome):
+        """
+        This function counts the user updates that were written or skipped.
+        :param outcome: str
+        """
+
+        with self.write_lock:
+            self.write_counts[outcome] += 1
 
     def process_user(self, user):
         """
-        This function will process each user and assign them to their Sign groups
-        :param user: dict()
+        This function will process each user and assign them to their Sign groups. Inactive accounts are reactivated
+        beforehand by reactivate_user. Nothing is written if the user is already in the right state.
+        :param user: UserRecord
         :return:
         """
-        temp_group = self.get_sign_group()
 
-        # Sort the groups and assign the user to first group
-        # Sign doesn't support multi group assignment at this time
-        for group in sorted(user['groups']):
-            group_id = temp_group.get(group)
-            if group_id is not None:
-                temp_payload = self.get_user_info(user, group_id, group)
-                #     # temp_payload.update(ldap_connector.get_extra_ldap_attribute(name))
-                self.reactivate_account(user['userId'], user['email'])
-                res = self.api_put_user_request(user['userId'], temp_payload)
-                if res.status_code == 200:
-                    self.logs['process'].info('<< Information Updated >> {}'.format(user['email']))
-
-                else:
-                    self.logs['error'].error("!! Adding User To Group Error !! {} \n{}".format(user['email'], res.text))
-                    self.logs['error'].error('!! Reason !! {}'.format(res.reason))
-            break
+        temp_payload, changes = self.get_user_update(user)
+
+        if temp_payload is not None:
+            # temp_payload.update(ldap_connector.get_extra_ldap_attribute(name))
+            res = self.api_put_user_request(user.user_id, temp_payload)
+            self.record_user_update(user, temp_payload, changes, res)
@@ -1,5 +1,6 @@
 import yaml
 import umapi_client
+import sign_sync.user_record
 
 
 class Umapi:
@@ -27,7 +28,7 @@ class Umapi:
         This function makes a query for users in a given list of groups.
         :param groups: list[]
         :param account_type: str
-        :return: dict()
+        :return: list[UserRecord]
         """
 
         user_list = list()
@@ -38,12 +39,10 @@ class Umapi:
             users = res.all_results()
 
             for user in users:
-                if account_type == 'all':
-                    user['productprofile'] = product_profile
-                    user_list.append(user)
-                elif user['type'] == account_type:
-                    user['productprofile'] = product_profile
-                    user_list.append(user)
+                if account_type == 'all' or user['type'] == account_type:
+                    user_list.append(sign_sync.user_record.UserRecord(user['email'], user['firstname'],
+                                                                      user['lastname'], user.get('groups') or (),
+                                                                      user['username'], product_profile))
 
         return user_list
 
@@ -0,0 +1,79 @@
+import threading
+
+
+class GroupDirectory:
+
+    def __init__(self, loader):
+        """
+        The group directory keeps a shared group name to groupId mapping so the group list is only fetched once
+        per run. It is safe to use from the worker threads.
+        :param loader: def() returning dict()
+        """
+
+        self.loader = loader
+        self.lock = threading.RLock()
+        self.groups = None
+
+    def get_groups(self):
+        """
+        This function returns a copy of the directory. The groups are fetched on first use.
+        :return: dict()
+        """
+
+        with self.lock:
+            if self.groups is None:
+                self.groups = dict(self.loader())
+
+            return dict(self.groups)
+
+    def get(self, group_name, default=None):
+        """
+        This function returns the groupId of a group.
+        :param group_name: str
+        :param default: str
+        :return: str
+        """
+
+        with self.lock:
+            if self.groups is None:
+                self.get_groups()
+
+            return self.groups.get(group_name, default)
+
+    def add(self, group_name, group_id):
+        """
+        This function adds a group that was created during the run to the directory.
+        :param group_name: str
+        :param group_id: str
+        """
+
+        with self.lock:
+            if self.groups is None:
+                self.get_groups()
+
+            self.groups[group_name] = group_id
+
+    def invalidate(self):
+        """
+        This function drops the directory so it will be fetched again on next use.
+        """
+
+        with self.lock:
+            self.groups = None
+
+    def refresh(self):
+        """
+        This function fetches the directory again right away.
+        :return: dict()
+        """
+
+        with self.lock:
+            self.invalidate()
+
+            return self.get_groups()
+
+    def __contains__(self, group_name):
+        return self.get(group_name) is not None
+
+    def __len__(self):
+        return len(self.get_groups())
@@ -0,0 +1,71 @@
+def normalize_email(email):
+    """
+    This function normalizes an email address so it can be used as a lookup key.
+    :param email: str
+    :return: str
+    """
+
+    if email is None:
+        return ''
+
+    return email.strip().lower()
+
+
+class Reconciler:
+
+    def __init__(self, source_users, ignored_emails=None):
+        """
+        The reconciler holds the source state of the sync so every phase can compare it against Adobe Sign.
+        :param source_users: list[UserRecord]
+        :param ignored_emails: list[]
+        """
+
+        self.source_users = source_users
+        self.source_index = dict()
+        self.ignored_emails = set(normalize_email(email) for email in ignored_emails or [])
+
+        for user in source_users:
+            self.source_index.setdefault(user.key, []).append(user)
+
+    def reconcile(self, sign_users):
+        """
+        This function compares the source users against the users in SIGN and sorts them into the users that have
+        to be added and the users that have to be updated. The SIGN users are consumed as they arrive, so a paged
+        listing doesn't have to be fetched completely first. The SIGN users to deactivate are found separately by
+        iter_deactivation_candidates.
+        :param sign_users: iterable of dict()
+        :return: dict()
+        """
+
+        matched = set()
+        update_list = []
+
+        for sign_user in sign_users:
+            key = normalize_email(sign_user['email'])
+            source_users = self.source_index.get(key)
+
+            if source_users is not None and key not in matched:
+                matched.add(key)
+                for user in source_users:
+                    user.user_id = sign_user['userId']
+                    update_list.append(user)
+
+        add_list = [users[0] for key, users in self.source_index.items() if key not in matched]
+
+        return {
+            'add': add_list,
+            'update': update_list
+        }
+
+    def iter_deactivation_candidates(self, sign_users):
+        """
+        This function yields the SIGN users that aren't part of the source users as they arrive. Only these users
+        can be deactivated, so only their status has to be checked.
+        :param sign_users: iterable of dict()
+        :return: generator of dict()
+        """
+
+        for sign_user in sign_users:
+            key = normalize_email(sign_user['email'])
+            if key not in self.source_index and key not in self.ignored_emails:
+                yield sign_user
@@ -0,0 +1,79 @@
+import threading
+
+import sign_sync.group_directory
+
+
+class SignSnapshot:
+
+    def __init__(self, user_loader, group_loader):
+        """
+        The snapshot holds the users and groups of the SIGN account for one run. Both are fetched once, on first
+        use, and every phase reads them from here. Changes made by the sync are applied in place so later phases
+        see them without fetching again.
+        :param user_loader: def() returning an iterable of dict()
+        :param group_loader: def() returning dict()
+        """
+
+        self.user_loader = user_loader
+        self.users = None
+        self.user_index = dict()
+        self.lock = threading.RLock()
+        self.groups = sign_sync.group_directory.GroupDirectory(group_loader)
+
+    def iter_users(self):
+        """
+        This function yields the users of the account. The first full pass streams them from SIGN page by page and
+        records them; later passes replay the recorded users.
+        :return: generator of dict()
+        """
+
+        with self.lock:
+            users = None if self.users is None else list(self.users)
+
+        if users is not None:
+            for user in users:
+                yield user
+            return
+
+        loaded = []
+        for user in self.user_loader():
+            loaded.append(user)
+            yield user
+
+        with self.lock:
+            if self.users is None:
+                self.users = loaded
+                self.user_index = {user['userId']: user for user in loaded}
+
+    def add_user(self, user):
+        """
+        This function adds a user that was created during the run.
+        :param user: dict()
+        """
+
+        with self.lock:
+            if self.users is not None and user['userId'] not in self.user_index:
+                self.users.append(user)
+                self.user_index[user['userId']] = user
+
+    def update_user(self, user_id, fields):
+        """
+        This function applies a change made during the run to a user.
+        :param user_id: str
+        :param fields: dict()
+        """
+
+        with self.lock:
+            user = self.user_index.get(user_id)
+            if user is not None:
+                user.update(fields)
+
+    def invalidate(self):
+        """
+        This function drops the users and groups so they will be fetched again on next use.
+        """
+
+        with self.lock:
+            self.users = None
+            self.user_index = dict()
+            self.groups.invalidate()
@@ -0,0 +1,436 @@
+import hashlib
+import itertools
+import json
+import os
+import threading
+import time
+
+import sign_sync.reconciliation
+import sign_sync.user_record
+
+
+class UserCache:
+
+    def __init__(self, connector, cache_dir='cache'):
+        """
+        The user cache holds the state of the previous sync for a connector.
+        :param connector: str
+        :param cache_dir: str
+        """
+
+        self.file_path = os.path.join(cache_dir, 'user_cache_{}.json'.format(connector))
+        self.index = None
+
+    def exists(self):
+        """
+        This function checks if a previous sync state has been saved.
+        :return: bool
+        """
+
+        return os.path.isfile(self.file_path)
+
+    @staticmethod
+    def get_fingerprint(user):
+        """
+        This function creates a stable fingerprint of the content of a user. Groups are compared as a set, so the
+        order the connector returned them in doesn't change the fingerprint.
+        :param user: dict()
+        :return: str
+        """
+
+        if user.get('groups'):
+            user = dict(user, groups=sorted(user['groups']))
+
+        content = json.dumps(user, sort_keys=True, separators=(',', ':'), default=str)
+
+        return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+    def load(self):
+        """
+        This function loads the previous sync state once and indexes it by email. Each email maps the fingerprints
+        of its cached records to the records themselves.
+        :return: dict()
+        """
+
+        self.index = dict()
+
+        if self.exists():
+            with open(self.file_path, 'r') as file:
+                cached_users = json.load(file)
+
+            for user in cached_users:
+                key = sign_sync.reconciliation.normalize_email(user.get('email'))
+                self.index.setdefault(key, dict())[self.get_fingerprint(user)] = user
+
+        return self.index
+
+    def find_difference(self, user_list):
+        """
+        This function will find the difference between the current sync and the previous sync state in one pass.
+        :param user_list: list[UserRecord]
+        :return: list[UserRecord], dict()
+        """
+
+        if self.index is None:
+            self.load()
+
+        difference_list = []
+        changes = dict()
+
+        for user in user_list:
+            cached_records = self.index.get(user.key)
+            data = user.to_dict()
+
+            if cached_records is None:
+                difference_list.append(user)
+                changes[user.email] = ['new']
+            elif self.get_fingerprint(data) not in cached_records:
+                difference_list.append(user)
+                changes[user.email] = self.get_changed_fields(self.get_cached_record(cached_records, data), data)
+
+        return difference_list, changes
+
+    @staticmethod
+    def get_cached_record(cached_records, user):
+        """
+        This function picks the cached record a user is compared against. An email has a record for every product
+        profile it was synced under, so the record with the same product profile is used when there is one.
+        :param cached_records: dict()
+        :param user: dict()
+        :return: dict()
+        """
+
+        for cached_user in cached_records.values():
+            if cached_user.get('productprofile') == user.get('productprofile'):
+                return cached_user
+
+        return next(iter(cached_records.values()))
+
+    @staticmethod
+    def get_changed_fields(cached_user, user):
+        """
+        This function returns the fields that differ between the cached record and the current record of a user.
+        :param cached_user: dict()
+        :param user: dict()
+        :return: list[]
+        """
+
+        fields = set(cached_user) | set(user)
+        changed = []
+
+        for field in sorted(fields):
+            cached_value, value = cached_user.get(field), user.get(field)
+            if field == 'groups':
+                cached_value, value = sorted(cached_value or ()), sorted(value or ())
+            if cached_value != value:
+                changed.append(field)
+
+        return changed
+
+    def save(self, user_list):
+        """
+        This function will save the cache file.
+        :param user_list: list[UserRecord]
+        """
+
+        with open(self.file_path, 'w') as file:
+            json.dump([user.to_dict() for user in user_list], file)
+
+
+class StatusCache:
+
+    def __init__(self, ttl=None, cache_dir='cache'):
+        """
+        The status cache holds the last known status of each SIGN user together with its ETag, so the status of a
+        user only has to be fetched again when it is stale or has changed.
+        :param ttl: int
+        :param cache_dir: str
+        """
+
+        self.file_path = os.path.join(cache_dir, 'user_status_cache.json')
+        self.ttl = ttl
+        self.entries = dict()
+        self.lock = threading.Lock()
+        self.counts = {
+            'fetched': 0,
+            'not_modified': 0,
+            'cached': 0,
+            'listing': 0
+        }
+
+    def load(self):
+        """
+        This function loads the statuses saved by the previous sync.
+        :return: dict()
+        """
+
+        if os.path.isfile(self.file_path):
+            with open(self.file_path, 'r') as file:
+                self.entries = json.load(file)
+
+        return self.entries
+
+    def save(self):
+        """
+        This function will save the status cache file.
+        """
+
+        with self.lock:
+            with open(self.file_path, 'w') as file:
+                json.dump(self.entries, file)
+
+    def get(self, user_id):
+        """
+        This function returns the cached entry of a user.
+        :param user_id: str
+        :return: dict()
+        """
+
+        return self.entries.get(user_id)
+
+    def is_fresh(self, entry):
+        """
+        This function checks if an entry is recent enough to be used without asking SIGN.
+        :param entry: dict()
+        :return: bool
+        """
+
+        return bool(self.ttl) and time.time() - entry['checked'] < self.ttl
+
+    def update(self, user_id, user_data, etag=None):
+        """
+        This function stores the status of a user together with the state the sync compares and writes.
+        :param user_id: str
+        :param user_data: dict()
+        :param etag: str
+        """
+
+        entry = {
+            'userStatus': user_data['userStatus'],
+            'email': user_data.get('email'),
+            'firstName': user_data.get('firstName'),
+            'lastName': user_data.get('lastName'),
+            'groupId': user_data.get('groupId'),
+            'roles': user_data.get('roles'),
+            'etag': etag,
+            'checked': time.time()
+        }
+
+        with self.lock:
+            self.entries[user_id] = entry
+
+    def set_status(self, user_id, status):
+        """
+        This function records a status change made by the sync. The ETag of the entry no longer applies.
+        :param user_id: str
+        :param status: str
+        """
+
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is not None:
+                entry['userStatus'] = status
+                entry['etag'] = None
+                entry['checked'] = time.time()
+
+    def set_state(self, user_id, payload):
+        """
+        This function records the group, names and roles the sync wrote for a user. The ETag of the entry no longer
+        applies.
+        :param user_id: str
+        :param payload: dict()
+        """
+
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is not None:
+                for field in ('groupId', 'firstName', 'lastName', 'roles'):
+                    entry[field] = payload[field]
+                entry['etag'] = None
+
+    def touch(self, user_id):
+        """
+        This function marks an entry as checked after SIGN confirmed it didn't change.
+        :param user_id: str
+        """
+
+        with self.lock:
+            self.entries[user_id]['checked'] = time.time()
+
+    def count(self, source):
+        """
+        This function counts where a status came from.
+        :param source: str
+        """
+
+        with self.lock:
+            self.counts[source] += 1
+
+    def get_counts(self):
+        """
+        This function returns how many statuses were fetched and how many were served without a full response.
+        :return: dict()
+        """
+
+        with self.lock:
+            return dict(self.counts)
+
+
+class LdapSyncState:
+
+    def __init__(self, full_resync_interval=None, cache_dir='cache'):
+        """
+        The LDAP sync state holds the directory as it was read by the previous sync, together with the
+        highestCommittedUSN of the domain controller at that time. Incremental syncs only read what changed after it.
+        :param full_resync_interval: int
+        :param cache_dir: str
+        """
+
+        self.file_path = os.path.join(cache_dir, 'ldap_sync_state.json')
+        self.full_resync_interval = full_resync_interval
+        self.usn = None
+        self.server = None
+        self.full_sync = None
+        self.group_map = None
+        self.members = dict()
+        self.users = dict()
+
+    def load(self):
+        """
+        This function loads the state saved by the previous sync.
+        :return: bool
+        """
+
+        if not os.path.isfile(self.file_path):
+            return False
+
+        with open(self.file_path, 'r') as file:
+            state = json.load(file)
+
+        self.usn = state['usn']
+        self.server = state['server']
+        self.full_sync = state['full_sync']
+        self.group_map = state['group_map']
+        self.members = state['members']
+        self.users = dict((user_dn, sign_sync.user_record.UserRecord.from_dict(user))
+                          for user_dn, user in state['users'].items())
+
+        return True
+
+    def save(self):
+        """
+        This function will save the LDAP sync state file.
+        """
+
+        state = {
+            'usn': self.usn,
+            'server': self.server,
+            'full_sync': self.full_sync,
+            'group_map': self.group_map,
+            'members': self.members,
+            'users': dict((user_dn, user.to_dict()) for user_dn, user in self.users.items())
+        }
+
+        with open(self.file_path, 'w') as file:
+            json.dump(state, file)
+
+    def needs_full_resync(self, usn, server, group_map):
+        """
+        This function checks if the saved state can't be used for an incremental sync. That is the case when there
+        is no state, when it was read from another domain controller or with another group mapping, when the
+        controller's USN went backwards or when the full resync interval has passed.
+        :param usn: int
+        :param server: str
+        :param group_map: dict()
+        :return: bool
+        """
+
+        if self.usn is None or self.server != server or self.group_map != group_map or usn < self.usn:
+            return True
+
+        return bool(self.full_resync_interval) and time.time() - self.full_sync >= self.full_resync_interval
+
+    def get_member_dns(self):
+        """
+        This function returns the DNs of the users that are a member of at least one targeted group.
+        :return: set()
+        """
+
+        return set(itertools.chain.from_iterable(self.members.values()))
+
+
+class AzureDeltaState:
+
+    def __init__(self, cache_dir='cache'):
+        """
+        The Azure delta state holds the users and groups of the directory as the previous sync left them, together
+        with the delta links Microsoft Graph returned. The next sync only asks for the changes since then.
+        :param cache_dir: str
+        """
+
+        self.file_path = os.path.join(cache_dir, 'azure_delta_state.json')
+        self.user_delta_link = None
+        self.group_delta_link = None
+        self.group_map = None
+        self.users = dict()
+        self.groups = dict()
+
+    def load(self):
+        """
+        This function loads the state saved by the previous sync.
+        :return: bool
+        """
+
+        if not os.path.isfile(self.file_path):
+            return False
+
+        with open(self.file_path, 'r') as file:
+            state = json.load(file)
+
+        self.user_delta_link = state['user_delta_link']
+        self.group_delta_link = state['group_delta_link']
+        self.group_map = state['group_map']
+        self.users = state['users']
+        self.groups = state['groups']
+
+        return True
+
+    def save(self):
+        """
+        This function will save the Azure delta state file.
+        """
+
+        state = {
+            'user_delta_link': self.user_delta_link,
+            'group_delta_link': self.group_delta_link,
+            'group_map': self.group_map,
+            'users': self.users,
+            'groups': self.groups
+        }
+
+        with open(self.file_path, 'w') as file:
+            json.dump(state, file)
+
+    def reset(self):
+        """
+        This function drops the state, so the next delta query starts from scratch.
+        """
+
+        self.user_delta_link = None
+        self.group_delta_link = None
+        self.users = dict()
+        self.groups = dict()
+
+    def get_user_groups(self):
+        """
+        This function inverts the group members into the names of the groups of each user.
+        :return: dict()
+        """
+
+        user_groups = dict()
+
+        for group in self.groups.values():
+            for user_id in group['members']:
+                user_groups.setdefault(user_id, []).append(group['displayName'])
+
+        return user_groups
@@ -1,52 +1,130 @@
-from threading import Thread
-import threading
+from threading import Thread, Event, BoundedSemaphore
+from queue import Queue
 
-class ThreadWorker(Thread):
-    def __init__(self, queue, func):
+STOP = object()
+
+
+class Task:
+
+    def __init__(self, func, item, on_done=None):
         """
-        This function initialized the thread
-        :param queue: list[]
+        This function initialized the task
         :param func: def()
+        :param item: dict()
+        :param on_done: def()
         """
-        Thread.__init__(self)
-        self.daemon = True
-        self.queue = queue
         self.func = func
+        self.item = item
+        self.on_done = on_done
+        self.result = None
+        self.error = None
+        self.done = Event()
 
     def run(self):
         """
-        This function runs the tread and adds it to the queue
+        This function runs the task and captures its result or the error it raised
         """
-        while True:
-            user = self.queue.get()
-            try:
-                self.func(user)
-            finally:
-                self.queue.task_done()
+        try:
+            self.result = self.func(self.item)
+        except (Exception, SystemExit) as error:
+            self.error = error
+        finally:
+            self.done.set()
+            if self.on_done is not None:
+                self.on_done()
 
-class ThreadWithReturnValue(Thread):
 
-    def __init__(self, queue, return_queue, func):
+class ThreadWorker(Thread):
+    def __init__(self, queue):
         """
         This function initialized the thread
-        :param queue: list[]
-        :param return_queue: list[]
-        :param func: def
+        :param queue: Queue
         """
         Thread.__init__(self)
         self.daemon = True
         self.queue = queue
-        self.return_queue = return_queue
-        self.func = func
 
     def run(self):
         """
-        This function runs the tread and adds it to the queue
+        This function runs the tasks from the queue until it receives the stop signal
         """
-
         while True:
-            user = self.queue.get()
+            task = self.queue.get()
             try:
-                self.func(user, self.return_queue)
+                if task is STOP:
+                    return
+                task.run()
             finally:
                 self.queue.task_done()
+
+
+class WorkerPool:
+    def __init__(self, size, phase_sizes=None):
+        """
+        This function initialized the pool and starts its threads
+        :param size: int
+        :param phase_sizes: dict()
+        """
+        self.size = size
+        self.phase_sizes = phase_sizes or {}
+        self.queue = Queue()
+        self.workers = []
+
+        for x in range(size):
+            worker = ThreadWorker(self.queue)
+            worker.start()
+            self.workers.append(worker)
+
+    def get_concurrency(self, phase=None):
+        """
+        This function returns how many tasks of a phase may run at the same time
+        :param phase: str
+        :return: int
+        """
+        concurrency = self.phase_sizes.get(phase) or self.size
+
+        return max(1, min(concurrency, self.size))
+
+    def map(self, func, items, phase=None):
+        """
+        This function runs func for every item and waits for all of them. Items are consumed lazily, so a generator
+        can keep producing while the first tasks run.
+        :param func: def()
+        :param items: list[]
+        :param phase: str
+        :return: list[], list[(item, error)]
+        """
+        semaphore = BoundedSemaphore(self.get_concurrency(phase))
+        tasks = []
+
+        for item in items:
+            semaphore.acquire()
+            task = Task(func, item, semaphore.release)
+            tasks.append(task)
+            self.queue.put(task)
+
+        for task in tasks:
+            task.done.wait()
+
+        results = [task.result for task in tasks if task.error is None]
+        errors = [(task.item, task.error) for task in tasks if task.error is not None]
+
+        return results, errors
+
+    def shutdown(self):
+        """
+        This function stops all threads once the queued tasks are finished
+        """
+        for worker in self.workers:
+            self.queue.put(STOP)
+
+        for worker in self.workers:
+            worker.join()
+
+        self.workers = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
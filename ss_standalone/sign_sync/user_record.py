@@ -0,0 +1,77 @@
+import sys
+
+import sign_sync.reconciliation
+
+
+class UserRecord:
+
+    __slots__ = ('key', 'email', 'username', 'firstname', 'lastname', 'groups', 'productprofile', 'user_id')
+
+    def __init__(self, email, firstname, lastname, groups=(), username=None, productprofile=None):
+        """
+        The user record holds a user of the connector for the whole sync. It only keeps the fields the sync uses,
+        group names are interned so every user of a group shares one string, and the normalized email is computed
+        once as the lookup key.
+        :param email: str
+        :param firstname: str
+        :param lastname: str
+        :param groups: list[]
+        :param username: str
+        :param productprofile: str
+        """
+
+        self.key = sign_sync.reconciliation.normalize_email(email)
+        self.email = email
+        self.username = email if username is None or username == email else username
+        self.firstname = firstname
+        self.lastname = lastname
+        self.groups = tuple(sys.intern(group) for group in groups)
+        self.productprofile = None if productprofile is None else sys.intern(productprofile)
+        self.user_id = None
+
+    def __repr__(self):
+        return 'UserRecord({!r})'.format(self.email)
+
+    def add_group(self, group):
+        """
+        This function adds a group to the user if the user isn't in it yet.
+        :param group: str
+        """
+
+        if group not in self.groups:
+            self.groups += (sys.intern(group),)
+
+    def to_dict(self):
+        """
+        This function converts the user to the dict format the cache files use.
+        :return: dict()
+        """
+
+        data = {
+            'email': self.email,
+            'firstname': self.firstname,
+            'groups': sorted(self.groups),
+            'lastname': self.lastname,
+            'username': self.username
+        }
+
+        if self.productprofile is not None:
+            data['productprofile'] = self.productprofile
+        if self.user_id is not None:
+            data['userId'] = self.user_id
+
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        This function creates a user from the dict format the cache files use.
+        :param data: dict()
+        :return: UserRecord
+        """
+
+        user = cls(data['email'], data['firstname'], data['lastname'], data.get('groups') or (),
+                   data.get('username'), data.get('productprofile'))
+        user.user_id = data.get('userId')
+
+        return user